@@ -1,12 +1,43 @@
+import logging
+import time
+_IMPORT_STARTED = time.perf_counter()
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
-from .sensor import update_listener
+from .cache import Deva4004ChannelCache
+from .const import DOMAIN
+from .poller import async_get_engine
+
+_LOGGER = logging.getLogger(__name__)
+
+# The sensor platform, and pysnmp with it, is only imported when an entry is set up
+IMPORT_TIME = time.perf_counter() - _IMPORT_STARTED
+
+async def update_listener(hass, entry):
+    _LOGGER.debug("update_listener called with options: %s", entry.options)
+    # The in-flight limit is baked into the session, so rebuild the entry rather than patch intervals
+    await hass.config_entries.async_reload(entry.entry_id)
+
 async def async_setup(hass: HomeAssistant, config: dict):
+    # Build the SNMP engine while Home Assistant sets up everything else
+    hass.async_create_background_task(async_get_engine(hass), f"{DOMAIN} create SNMP engine")
     return True
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
+    start = time.monotonic()
     entry.async_on_unload(entry.add_update_listener(update_listener))
     await hass.config_entries.async_forward_entry_setups(entry, ["sensor"])
+    entry_data = hass.data.get(DOMAIN, {}).get(entry.entry_id, {})
+    if entry_data:
+        entry_data["startup"] = {
+            "integration_import": IMPORT_TIME,
+            "engine_created": hass.data[DOMAIN].get("engine_created_in"),
+            "entities_added": time.monotonic() - start,
+        }
+        _LOGGER.debug("%s set up, entities added after %.3f s", entry.title, entry_data["startup"]["entities_added"])
+    # Set up from a cached channel table: check it against the device now that the entities are added
+    revalidate_channels = entry_data.get("revalidate_channels")
+    if revalidate_channels:
+        entry.async_create_background_task(hass, revalidate_channels(), f"{DOMAIN} revalidate channels")
     return True
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
@@ -14,3 +45,6 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     if unload_ok:
         hass.data.get("deva4004", {}).pop(entry.entry_id, None)
     return unload_ok
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    await Deva4004ChannelCache(hass, entry.entry_id).async_remove()
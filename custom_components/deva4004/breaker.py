@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import time
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Deva4004Breaker:
+    # Shared by both coordinators of a device. Closed: polls run as usual. Open: polls
+    # are skipped until the next probe is due, and the first coordinator to reach it
+    # sends the probe while the other waits on the lock for the answer. Half open: the
+    # probe was answered and the next poll decides whether to close or open again
+    def __init__(self, host: str, probe):
+        self.host = host
+        self._probe = probe
+        self._lock = asyncio.Lock()
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.backoff = None
+        self.next_probe = None
+
+    def delay(self) -> float:
+        return max(0.0, self.next_probe - time.monotonic())
+
+    async def async_allow(self) -> bool:
+        if self.state != BREAKER_OPEN:
+            return True
+        async with self._lock:
+            if self.state != BREAKER_OPEN:
+                return True
+            if time.monotonic() < self.next_probe:
+                return False
+            if await self._probe():
+                _LOGGER.info("DEVA4004 at %s answered the probe, resuming polls", self.host)
+                self.state = BREAKER_HALF_OPEN
+                return True
+            self._open(min(BREAKER_BACKOFF_MAX, self.backoff * 2))
+            _LOGGER.debug("DEVA4004 at %s still unreachable, next probe in %d s", self.host, self.backoff)
+            return False
+
+    def record(self, failed: bool):
+        if not failed:
+            if self.state != BREAKER_CLOSED:
+                _LOGGER.info("DEVA4004 at %s is reachable again", self.host)
+            self.state = BREAKER_CLOSED
+            self.failures = 0
+            self.backoff = None
+            self.next_probe = None
+            return
+
+        self.failures += 1
+        if self.state == BREAKER_HALF_OPEN:
+            # Answered the probe but not the poll; keep backing off from where we were
+            self._open(min(BREAKER_BACKOFF_MAX, self.backoff * 2))
+        elif self.state == BREAKER_CLOSED and self.failures >= BREAKER_THRESHOLD:
+            self._open(BREAKER_BACKOFF_INITIAL)
+            _LOGGER.warning(
+                "DEVA4004 at %s failed %d polls in a row; pausing polls and probing it every %d s or more",
+                self.host, self.failures, self.backoff,
+            )
+
+    def _open(self, backoff: float):
+        self.state = BREAKER_OPEN
+        self.backoff = backoff
+        self.next_probe = time.monotonic() + backoff
+
+    def stats(self):
+        return {
+            "consecutive_failures": self.failures,
+            "backoff": self.backoff,
+            "next_probe_in": round(self.delay(), 1) if self.state == BREAKER_OPEN else None,
+        }
@@ -0,0 +1,31 @@
+import logging
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Deva4004ChannelCache:
+    # The channel table from _get_logger_data, kept in .storage per entry so a restart
+    # can build entities before the device has answered
+    def __init__(self, hass: HomeAssistant, entry_id: str):
+        self._store = Store(hass, CHANNEL_CACHE_VERSION, f"{DOMAIN}.{entry_id}.channels")
+        self.channels = None
+
+    async def async_load(self):
+        stored = await self._store.async_load()
+        if stored is not None:
+            self.channels = stored.get("channels")
+        return self.channels
+
+    async def async_update(self, channels) -> bool:
+        # Returns True when the table differs from the cached one (and was saved)
+        if channels == self.channels:
+            return False
+        self.channels = channels
+        await self._store.async_save({"channels": channels})
+        return True
+
+    async def async_remove(self):
+        await self._store.async_remove()
@@ -1,9 +1,9 @@
+import ipaddress
 from homeassistant import config_entries
 from homeassistant.core import callback
 from homeassistant.helpers import config_validation as cv
 import voluptuous as vol
-from pysnmp.hlapi.v3arch.asyncio import SnmpEngine
-from .snmp_data import _get_logger_data
+from .poller import async_create_engine, async_get_engine
 from .const import *
 
 DATA_SCHEMA = vol.Schema(
@@ -12,10 +12,46 @@ DATA_SCHEMA = vol.Schema(
         vol.Required(CONF_IP_ADDRESS): str,
         vol.Required(CONF_PORT, default=DEFAULT_PORT): int,
         vol.Required(CONF_READ_COMMUNITY, default=DEFAULT_READ_COMMUNITY): cv.string,
+        vol.Required(CONF_SNMP_VERSION, default=SNMP_VERSION_AUTO): vol.In([SNMP_VERSION_AUTO, SNMP_VERSION_1, SNMP_VERSION_2C, SNMP_VERSION_3]),
         # vol.Optional(CONF_WRITE_COMMUNITY, default=DEFAULT_WRITE_COMMUNITY): cv.string,
     }
 )
 
+SCAN_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_NETWORK): cv.string,
+        vol.Required(CONF_PORT, default=DEFAULT_PORT): int,
+        vol.Required(CONF_READ_COMMUNITY, default=DEFAULT_READ_COMMUNITY): cv.string,
+    }
+)
+
+def _v3_schema(data):
+    return vol.Schema(
+        {
+            vol.Required(CONF_V3_USERNAME, default=data.get(CONF_V3_USERNAME, "")): cv.string,
+            vol.Required(CONF_V3_AUTH_PROTOCOL, default=data.get(CONF_V3_AUTH_PROTOCOL, DEFAULT_V3_AUTH_PROTOCOL)): vol.In(V3_AUTH_PROTOCOLS),
+            vol.Optional(CONF_V3_AUTH_KEY, default=data.get(CONF_V3_AUTH_KEY, "")): cv.string,
+            vol.Required(CONF_V3_PRIV_PROTOCOL, default=data.get(CONF_V3_PRIV_PROTOCOL, DEFAULT_V3_PRIV_PROTOCOL)): vol.In(V3_PRIV_PROTOCOLS),
+            vol.Optional(CONF_V3_PRIV_KEY, default=data.get(CONF_V3_PRIV_KEY, "")): cv.string,
+        }
+    )
+
+def _v3_errors(data):
+    # A key is required by its protocol; pysnmp fails on empty or short ones with
+    # errors that mean nothing to the user, so check them before it sees them
+    errors = {}
+    auth_protocol = data[CONF_V3_AUTH_PROTOCOL]
+    priv_protocol = data[CONF_V3_PRIV_PROTOCOL]
+    if auth_protocol == "none":
+        if priv_protocol != "none":
+            errors[CONF_V3_PRIV_PROTOCOL] = "priv_without_auth"
+        return errors
+    if len(data.get(CONF_V3_AUTH_KEY, "")) < V3_MIN_KEY_LENGTH:
+        errors[CONF_V3_AUTH_KEY] = "key_too_short"
+    if priv_protocol != "none" and len(data.get(CONF_V3_PRIV_KEY, "")) < V3_MIN_KEY_LENGTH:
+        errors[CONF_V3_PRIV_KEY] = "key_too_short"
+    return errors
+
 class Deva4004OptionsFlowHandler(config_entries.OptionsFlow):
     def __init__(self, config_entry: config_entries.ConfigEntry) -> None:
         super().__init__()
@@ -29,6 +65,17 @@ class Deva4004OptionsFlowHandler(config_entries.OptionsFlow):
             {
                 vol.Required(CONF_POLL_INTERVAL_DATA, default=self._config_entry.options.get(CONF_POLL_INTERVAL_DATA, DEFAULT_POLL_INTERVAL_DATA)): vol.All(int, vol.Range(min=1)),
                 vol.Required(CONF_POLL_INTERVAL_ALARMS, default=self._config_entry.options.get(CONF_POLL_INTERVAL_ALARMS, DEFAULT_POLL_INTERVAL_ALARMS)): vol.All(int, vol.Range(min=10)),
+                vol.Required(CONF_MAX_IN_FLIGHT, default=self._config_entry.options.get(CONF_MAX_IN_FLIGHT, DEFAULT_MAX_IN_FLIGHT)): vol.All(int, vol.Range(min=1, max=16)),
+                vol.Required(CONF_MONITOR_MODE, default=self._config_entry.options.get(CONF_MONITOR_MODE, DEFAULT_MONITOR_MODE)): vol.In([MONITOR_MODE_TARGETED, MONITOR_MODE_WALK]),
+                vol.Required(CONF_POLL_MODE, default=self._config_entry.options.get(CONF_POLL_MODE, DEFAULT_POLL_MODE)): vol.In([POLL_MODE_FIXED, POLL_MODE_SCAN]),
+                vol.Required(CONF_HISTORY_SIZE, default=self._config_entry.options.get(CONF_HISTORY_SIZE, DEFAULT_HISTORY_SIZE)): vol.All(int, vol.Range(min=0, max=3600)),
+                vol.Required(CONF_AGGREGATION_WINDOW, default=self._config_entry.options.get(CONF_AGGREGATION_WINDOW, DEFAULT_AGGREGATION_WINDOW)): vol.All(int, vol.Range(min=0, max=3600)),
+                **{
+                    vol.Required(option, default=self._config_entry.options.get(option, DEFAULT_AGGREGATION_POLICY[field])): vol.In(AGGREGATION_POLICIES)
+                    for field, option in CONF_AGGREGATION_POLICY.items()
+                },
+                vol.Required(CONF_TRAP_ENABLED, default=self._config_entry.options.get(CONF_TRAP_ENABLED, DEFAULT_TRAP_ENABLED)): bool,
+                vol.Required(CONF_TRAP_PORT, default=self._config_entry.options.get(CONF_TRAP_PORT, DEFAULT_TRAP_PORT)): vol.All(int, vol.Range(min=1, max=65535)),
             }
         )
 
@@ -38,8 +85,11 @@ class Deva4004ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     VERSION = 1
 
     async def async_step_user(self, user_input=None):
+        return self.async_show_menu(step_id="user", menu_options=["manual", "scan"])
+
+    async def async_step_manual(self, user_input=None):
         if user_input is None:
-            return self.async_show_form(step_id="user", data_schema=DATA_SCHEMA)
+            return self.async_show_form(step_id="manual", data_schema=DATA_SCHEMA)
 
         host = user_input[CONF_IP_ADDRESS]
         name = user_input[CONF_NAME]
@@ -52,6 +102,7 @@ class Deva4004ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 vol.Required(CONF_IP_ADDRESS,default=host): str,
                 vol.Required(CONF_PORT, default=port): int,
                 vol.Required(CONF_READ_COMMUNITY, default=community): cv.string,
+                vol.Required(CONF_SNMP_VERSION, default=user_input[CONF_SNMP_VERSION]): vol.In([SNMP_VERSION_AUTO, SNMP_VERSION_1, SNMP_VERSION_2C, SNMP_VERSION_3]),
             }
         )
 
@@ -59,19 +110,147 @@ class Deva4004ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             if not (1 <= port <= 65535):
                 raise ValueError("Invalid port number.")
         except ValueError as e:
-            return self.async_show_form(step_id="user", data_schema=DATA_SCHEMA_COMPILED, errors={"base": str(e)})
+            return self.async_show_form(step_id="manual", data_schema=DATA_SCHEMA_COMPILED, errors={"base": str(e)})
 
+        if user_input[CONF_SNMP_VERSION] == SNMP_VERSION_3:
+            self._user_input = user_input
+            return await self.async_step_snmpv3()
+
+        return await self._async_validate(user_input, "manual", DATA_SCHEMA_COMPILED)
+
+    async def async_step_snmpv3(self, user_input=None):
+        if user_input is None:
+            return self.async_show_form(step_id="snmpv3", data_schema=_v3_schema({}))
+        errors = _v3_errors(user_input)
+        if errors:
+            return self.async_show_form(step_id="snmpv3", data_schema=_v3_schema(user_input), errors=errors)
+        data = {**self._user_input, **user_input}
+        return await self._async_validate(data, "snmpv3", _v3_schema(user_input))
+
+    async def _async_validate(self, user_input, step_id, schema):
+        v3 = user_input[CONF_SNMP_VERSION] == SNMP_VERSION_3
+        # The entry builds an engine of its own for its SNMPv3 user, so this one is only for the check
+        engine = await async_create_engine(self.hass) if v3 else await async_get_engine(self.hass)
         try:
-            engine = await self.hass.async_add_executor_job(SnmpEngine)
-            data = await _get_logger_data(engine, host, port, community)
+            return await self._async_validate_on(engine, user_input, step_id, schema)
+        finally:
+            if v3:
+                engine.close_dispatcher()
+
+    async def _async_validate_on(self, engine, user_input, step_id, schema):
+        host = user_input[CONF_IP_ADDRESS]
+        port = user_input[CONF_PORT]
+        community = user_input[CONF_READ_COMMUNITY]
+        # Imported here rather than with the flow: the engine above has loaded pysnmp by now
+        from .snmp_data import Deva4004Session, _channel_rows, _get_identity, _get_snmp_table
+        # An SNMPv1-only agent drops v2c requests, so an unanswered v2c GET means v1; a
+        # v2c agent that happens to lose it still works (slower) as v1
+        versions = [SNMP_VERSION_2C, SNMP_VERSION_1] if user_input[CONF_SNMP_VERSION] == SNMP_VERSION_AUTO else [user_input[CONF_SNMP_VERSION]]
+        for version in versions:
+            session = Deva4004Session(engine, host, port, community, version=version, usm=user_input)
+            identity, error = await _get_identity(session)
+            if identity:
+                break
+        if error and version == SNMP_VERSION_3:
+            return self.async_show_form(step_id=step_id, data_schema=schema, errors={"base": "v3_rejected"}, description_placeholders={"error": error})
+        if error:
+            return self.async_show_form(step_id=step_id, data_schema=schema, errors={"base": error})
+        user_input = {**user_input, CONF_SNMP_VERSION: version}
+
+        fw_version, serial_number = identity
+        await self.async_set_unique_id(serial_number)
+        self._abort_if_unique_id_configured()
+
+        try:
+            table, table_error = await _get_snmp_table(session, LOGGER_TABLE_COLUMNS)
         except Exception as e:
-            return self.async_show_form(step_id="user", data_schema=DATA_SCHEMA_COMPILED, errors={"base": str(e)})
+            return self.async_show_form(step_id=step_id, data_schema=schema, errors={"base": str(e)})
+        channels = _channel_rows(table, fw_version, serial_number)
+        if not channels:
+            return self.async_show_form(step_id=step_id, data_schema=schema, errors={"base": "No data in the device"})
+
+        if not table_error:
+            # The new entry sets up from this table instead of reading it again
+            self.hass.data.setdefault(DOMAIN, {}).setdefault("channel_handover", {})[serial_number] = channels
+        return self.async_create_entry(title=user_input[CONF_NAME], data=user_input)
+
+    async def async_step_scan(self, user_input=None):
+        if user_input is None:
+            return self.async_show_form(step_id="scan", data_schema=SCAN_SCHEMA)
+
+        schema = self.add_suggested_values_to_schema(SCAN_SCHEMA, user_input)
+        try:
+            network = ipaddress.ip_network(user_input[CONF_NETWORK], strict=False)
+        except ValueError as e:
+            return self.async_show_form(step_id="scan", data_schema=schema, errors={"base": str(e)})
+        if network.num_addresses > DISCOVERY_MAX_HOSTS:
+            return self.async_show_form(step_id="scan", data_schema=schema, errors={"base": f"Scan at most {DISCOVERY_MAX_HOSTS} addresses at a time"})
+
+        # Receivers already set up are left out, by serial number or by address
+        configured = {entry.data.get(CONF_IP_ADDRESS) for entry in self._async_current_entries(include_ignore=False)}
+        hosts = [str(host) for host in (network.hosts() if network.num_addresses > 2 else network)]
+        engine = await async_get_engine(self.hass)
+        from .snmp_data import _discover_receivers
+        found = await _discover_receivers(
+            engine,
+            [host for host in hosts if host not in configured],
+            user_input[CONF_PORT],
+            user_input[CONF_READ_COMMUNITY],
+        )
+        current_ids = self._async_current_ids()
+        self._scan = user_input
+        self._found = {serial_number: found[serial_number] for serial_number in found if serial_number not in current_ids}
+        if not self._found:
+            return self.async_show_form(step_id="scan", data_schema=schema, errors={"base": f"No new DEVA4004 receivers found in {network}"})
+        return await self.async_step_scan_select()
+
+    async def async_step_scan_select(self, user_input=None):
+        if user_input is None:
+            receivers = {
+                serial_number: f"{host} (serial {serial_number}, firmware {fw_version}, SNMP v{version})"
+                for serial_number, (host, version, fw_version) in sorted(self._found.items(), key=lambda item: ipaddress.ip_address(item[1][0]))
+            }
+            return self.async_show_form(
+                step_id="scan_select",
+                data_schema=vol.Schema({vol.Required(CONF_RECEIVERS, default=list(receivers)): cv.multi_select(receivers)}),
+            )
+
+        selected = user_input[CONF_RECEIVERS]
+        if not selected:
+            return self.async_abort(reason="no_receivers_selected")
+        # A flow creates one entry: this one takes the first receiver, each of the others
+        # is handed to a discovery flow of its own
+        entries = [(serial_number, self._entry_data(serial_number)) for serial_number in selected]
+        for serial_number, data in entries[1:]:
+            self.hass.async_create_task(
+                self.hass.config_entries.flow.async_init(
+                    DOMAIN,
+                    context={"source": config_entries.SOURCE_INTEGRATION_DISCOVERY},
+                    data={**data, CONF_SERIAL_NUMBER: serial_number},
+                )
+            )
+        serial_number, data = entries[0]
+        await self.async_set_unique_id(serial_number)
+        self._abort_if_unique_id_configured()
+        return self.async_create_entry(title=data[CONF_NAME], data=data)
+
+    async def async_step_integration_discovery(self, discovery_info):
+        # A receiver picked in another flow's network scan, already probed there
+        data = dict(discovery_info)
+        await self.async_set_unique_id(data.pop(CONF_SERIAL_NUMBER))
+        self._abort_if_unique_id_configured()
+        return self.async_create_entry(title=data[CONF_NAME], data=data)
 
-        if data is None or not data[0]:
-            return self.async_show_form(step_id="user", data_schema=DATA_SCHEMA_COMPILED, errors={"base": "No data in the device"})
+    def _entry_data(self, serial_number):
+        host, version, _ = self._found[serial_number]
+        return {
+            CONF_NAME: f"{DEFAULT_NAME} {host}",
+            CONF_IP_ADDRESS: host,
+            CONF_PORT: self._scan[CONF_PORT],
+            CONF_READ_COMMUNITY: self._scan[CONF_READ_COMMUNITY],
+            CONF_SNMP_VERSION: version,
+        }
 
-        return self.async_create_entry(title=name, data=user_input)
-    
     @staticmethod
     @callback
     def async_get_options_flow(
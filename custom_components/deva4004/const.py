@@ -4,22 +4,114 @@ CONF_IP_ADDRESS = "ip_address"
 CONF_PORT = "port"
 CONF_READ_COMMUNITY = "read_community"
 CONF_WRITE_COMMUNITY = "write_community"
+CONF_SNMP_VERSION = "snmp_version"
+CONF_V3_USERNAME = "v3_username"
+CONF_V3_AUTH_PROTOCOL = "v3_auth_protocol"
+CONF_V3_AUTH_KEY = "v3_auth_key"
+CONF_V3_PRIV_PROTOCOL = "v3_priv_protocol"
+CONF_V3_PRIV_KEY = "v3_priv_key"
 
 DEFAULT_NAME = "DEVA4004"
 DEFAULT_PORT = 161
 DEFAULT_READ_COMMUNITY = "DEVA4004"
 DEFAULT_WRITE_COMMUNITY = "DEVA4004"
+SNMP_VERSION_AUTO = "auto"
+SNMP_VERSION_1 = "1"
+SNMP_VERSION_2C = "2c"
+SNMP_VERSION_3 = "3"
+# Entries created before the version choice existed talk SNMPv1
+DEFAULT_SNMP_VERSION = SNMP_VERSION_1
+V3_AUTH_PROTOCOLS = ["none", "md5", "sha", "sha256"]
+V3_PRIV_PROTOCOLS = ["none", "des", "aes"]
+DEFAULT_V3_AUTH_PROTOCOL = "sha"
+DEFAULT_V3_PRIV_PROTOCOL = "aes"
+# pysnmp derives the localized keys from these and refuses anything shorter
+V3_MIN_KEY_LENGTH = 8
 
 CONF_POLL_INTERVAL_DATA = "poll_interval_data"
 DEFAULT_POLL_INTERVAL_DATA = 3
 CONF_POLL_INTERVAL_ALARMS = "poll_interval_alarms"
 DEFAULT_POLL_INTERVAL_ALARMS = 90
+CONF_MAX_IN_FLIGHT = "max_in_flight"
+DEFAULT_MAX_IN_FLIGHT = 4
+# Requests in flight across every configured receiver, on top of the per-device limit
+FLEET_MAX_IN_FLIGHT = 16
+CONF_MONITOR_MODE = "monitor_mode"
+MONITOR_MODE_TARGETED = "targeted"
+MONITOR_MODE_WALK = "walk"
+DEFAULT_MONITOR_MODE = MONITOR_MODE_TARGETED
+CONF_POLL_MODE = "poll_mode"
+POLL_MODE_FIXED = "fixed"
+POLL_MODE_SCAN = "scan"
+DEFAULT_POLL_MODE = POLL_MODE_FIXED
+CONF_TRAP_ENABLED = "trap_enabled"
+DEFAULT_TRAP_ENABLED = False
+CONF_TRAP_PORT = "trap_port"
+DEFAULT_TRAP_PORT = 1162
+CONF_HISTORY_SIZE = "history_size"
+DEFAULT_HISTORY_SIZE = 60
+CONF_AGGREGATION_WINDOW = "aggregation_window"
+DEFAULT_AGGREGATION_WINDOW = 0
+AGGREGATION_MEAN = "mean"
+AGGREGATION_MIN = "min"
+AGGREGATION_MAX = "max"
+AGGREGATION_POLICIES = [AGGREGATION_MEAN, AGGREGATION_MIN, AGGREGATION_MAX]
+# Level sensors publish one value per aggregation window; by default the one that shows
+# the excursion that matters: fades for RF, overmodulation for MPX and the audio channels
+DEFAULT_AGGREGATION_POLICY = {
+    "rf_level": AGGREGATION_MIN,
+    "mpx_level": AGGREGATION_MAX,
+    "pilot_level": AGGREGATION_MEAN,
+    "rds_level": AGGREGATION_MEAN,
+    "left_level": AGGREGATION_MAX,
+    "right_level": AGGREGATION_MAX,
+}
+CONF_AGGREGATION_POLICY = {field: f"aggregation_{field}" for field in DEFAULT_AGGREGATION_POLICY}
+# With traps pushing alarm changes, the alarm table is only polled this often to reconcile
+TRAP_RECONCILE_INTERVAL = 900
+
+# Seconds between background checks of the channel table (one table walk) for stations
+# renamed, retuned or switched on/off on the receiver
+CHANNEL_REVALIDATE_INTERVAL = 3600
+
+# The config flow checks an address with one firmware/serial GET: a short timeout and a
+# single retry, so a wrong address fails in seconds rather than after the setup budget
+CONFIG_PROBE_TIMEOUT = 2.0
+CONFIG_PROBE_RETRIES = 1
+
+# Subnet discovery probes up to a whole /24 at once, each host with one identity GET
+# under a short timeout, so a scan takes about one timeout round plus pysnmp's few ms of
+# target setup per host; larger ranges are refused
+CONF_NETWORK = "network"
+CONF_RECEIVERS = "receivers"
+CONF_SERIAL_NUMBER = "serial_number"
+DISCOVERY_MAX_IN_FLIGHT = 256
+DISCOVERY_TIMEOUT = 1.0
+DISCOVERY_RETRIES = 1
+DISCOVERY_MAX_HOSTS = 512
+
+# Scan-aware polling: poll this long after a predicted channel switch, never more often
+# than SCAN_MIN_INTERVAL, and move learned dwell times this far towards each measurement.
+# An unseen switch is placed this far into the window it could have happened in; erring
+# early keeps dwells shorter than acq_time from turning into missed channels.
+SCAN_SETTLE_TIME = 0.5
+SCAN_MIN_INTERVAL = 1.0
+SCAN_DWELL_SMOOTHING = 0.3
+SCAN_SWITCH_ESTIMATE = 0.4
+
+# A frequency's monitoring data is dropped (and its entities go unavailable) when it has
+# not been reported for this many scan cycles, where a cycle is the longer of the sum of
+# the active channels' acq_time and one poll per active channel; never under the minimum
+MONITOR_TTL_CYCLES = 3
+MONITOR_TTL_MIN = 60
 
 BASE_OID_NAME = ".1.3.6.1.4.1.35833.10.2.5.2.1.4"
 BASE_OID_ACTIVE_INACTIVE = ".1.3.6.1.4.1.35833.10.2.5.2.1.2"
 BASE_OID_FREQUENCY_MHZ = ".1.3.6.1.4.1.35833.10.2.5.2.1.3"
 BASE_OID_CHANNEL_NUMBER = ".1.3.6.1.4.1.35833.10.2.5.2.1.1"
 BASE_OID_ACQ_TIME = ".1.3.6.1.4.1.35833.10.2.5.2.1.5"
+LOGGER_TABLE_COLUMNS = (BASE_OID_NAME, BASE_OID_ACTIVE_INACTIVE, BASE_OID_FREQUENCY_MHZ, BASE_OID_CHANNEL_NUMBER, BASE_OID_ACQ_TIME)
+LOGGER_TABLE_FIELDS = ("name", "active", "frequency", "channel_number", "acq_time")
 OID_FW_VERSION = ".1.3.6.1.4.1.35833.10.1.1.0"
 OID_SERIAL_VERSION = ".1.3.6.1.4.1.35833.10.1.2.0"
 
@@ -34,11 +126,61 @@ OID_RDS_LEVEL = "1.3.6.1.4.1.35833.10.3.18.0"
 OID_RDS_PI = "1.3.6.1.4.1.35833.10.3.40.0"
 OID_RDS_PS = "1.3.6.1.4.1.35833.10.3.41.0"
 OID_RDS_RT = "1.3.6.1.4.1.35833.10.3.42.0"
+MONITOR_OIDS = (
+    OID_FREQ_MONITOR,
+    OID_RF_LEVEL,
+    OID_MPX_LEVEL,
+    OID_LEFT_LEVEL,
+    OID_RIGHT_LEVEL,
+    OID_PILOT_LEVEL,
+    OID_RDS_LEVEL,
+    OID_RDS_PI,
+    OID_RDS_PS,
+    OID_RDS_RT,
+)
 
 BASE_OID_ALARM_RF = ".1.3.6.1.4.1.35833.10.4.14.1.2"
 BASE_OID_ALARM_MPX = ".1.3.6.1.4.1.35833.10.4.14.1.3"
 BASE_OID_ALARM_PILOT = ".1.3.6.1.4.1.35833.10.4.14.1.5"
 BASE_OID_ALARM_RDS = ".1.3.6.1.4.1.35833.10.4.14.1.6"
+ALARM_TABLE_COLUMNS = (BASE_OID_ALARM_RF, BASE_OID_ALARM_MPX, BASE_OID_ALARM_PILOT, BASE_OID_ALARM_RDS)
+
+CHANNEL_CACHE_VERSION = 1
+
+# SNMP instrumentation: counters and latency histograms are halved after this many
+# samples, and this many of the last operations are kept for the diagnostics download
+METRICS_DECAY_SAMPLES = 500
+METRICS_RECENT_OPERATIONS = 50
+
+# Adaptive SNMP timeouts: smoothed RTT and its variation per device (RFC 6298 gains),
+# with the timeout clamped to [RTO_MIN, RTO_MAX] and rounded up to a sqrt(2) grid so
+# the session only ever builds a handful of transport targets. Timeouts double on
+# every timed out request until a clean answer comes back
+RTT_ALPHA = 0.125
+RTT_BETA = 0.25
+RTO_INITIAL = 1.0
+RTO_MIN = 0.25
+RTO_MAX = 10.0
+# A poll's requests may wait this fraction of the poll interval for answers, which
+# bounds timeout * (retries + 1); outside a poll (setup) they get SNMP_SETUP_BUDGET
+SNMP_RETRY_BUDGET = 0.8
+SNMP_SETUP_BUDGET = 20.0
+SNMP_MAX_RETRIES = 5
+
+# Circuit breaker: after this many failed polls in a row a receiver counts as
+# unreachable, polling stops and a single firmware-version GET probes it, first after
+# BREAKER_BACKOFF_INITIAL seconds and then twice as long after each failed probe
+BREAKER_THRESHOLD = 3
+BREAKER_BACKOFF_INITIAL = 10
+BREAKER_BACKOFF_MAX = 600
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+# Upper bound on var-binds per GETBULK response (split between the columns when walking
+# several table columns at once). SNMPv1 has no GETBULK, pysnmp sends one GETNEXT per
+# row instead; v3 leaves headroom in the datagram for the USM header and encryption
+SNMP_MAX_VAR_BINDS = {SNMP_VERSION_1: 1, SNMP_VERSION_2C: 50, SNMP_VERSION_3: 30}
 
 antenna_dict = {
     4: "Disable",
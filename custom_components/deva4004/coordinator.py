@@ -0,0 +1,219 @@
+import logging
+from datetime import timedelta
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from .breaker import Deva4004Breaker
+from .metrics import Deva4004Metrics
+from .monitoring import Deva4004MonitoringStore
+from .history import Deva4004Aggregator, Deva4004History
+from .scheduler import ScanScheduler
+from .snmp_data import Deva4004Session, MONITOR_FIELDS, MONITOR_LEVEL_FIELDS, _get_monitor_sample
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class Deva4004Coordinator(DataUpdateCoordinator):
+    # Polls on the fleet poller's grid: at phase * interval + n * interval on the loop
+    # clock, so devices sharing an interval take turns instead of firing together.
+    # The coordinator's own interval timer stays off; every poll arms the next one
+    def __init__(self, hass: HomeAssistant, name: str, update_interval: timedelta, phase: float = 0.0, update_method=None, metrics: Deva4004Metrics | None = None, breaker: Deva4004Breaker | None = None):
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=name,
+            update_interval=None,
+            update_method=update_method,
+        )
+        self.poll_interval = update_interval.total_seconds()
+        self.phase = phase
+        self.metrics = metrics
+        self.breaker = breaker
+        self.lag = None
+        self._due = None
+        self._next_poll = None
+        self._poll_task = None
+        self._stopped = False
+
+    async def _async_update_data(self):
+        # A refresh from elsewhere stands in for the scheduled one, which the end of this poll re-arms
+        self._cancel_next_poll()
+        now = self.hass.loop.time()
+        if self._due is not None:
+            # Early (manual) refreshes count as on time
+            self.lag = max(0.0, now - self._due)
+        breaker = self.breaker
+        if breaker and not await breaker.async_allow():
+            # Unreachable: sleep until the next probe instead of polling into timeouts
+            self._schedule_in(breaker.delay())
+            raise UpdateFailed(f"Receiver unreachable, next probe in {breaker.delay():.0f} s")
+
+        delay = None
+        poll = self.metrics.begin_poll(self.poll_interval * SNMP_RETRY_BUDGET) if self.metrics else None
+        failed = True
+        try:
+            data, delay = await self._async_poll()
+            failed = False
+            return data
+        finally:
+            unreachable = failed
+            if poll:
+                unreachable = self.metrics.end_poll(self.name, poll, failed)
+            if breaker:
+                breaker.record(unreachable)
+                if breaker.state == BREAKER_OPEN:
+                    delay = breaker.delay()
+            self._schedule_in(self._grid_delay(self.hass.loop.time()) if delay is None else delay)
+
+    async def _async_poll(self):
+        # (data, seconds until the next poll or None to stay on the grid)
+        return await super()._async_update_data(), None
+
+    def _grid_delay(self, now: float) -> float:
+        delay = (self.phase * self.poll_interval - now) % self.poll_interval
+        if delay < self.poll_interval / 4:
+            # Ran late enough that the next slot is close; skip it rather than poll back to back
+            delay += self.poll_interval
+        return delay
+
+    def _schedule_in(self, delay: float):
+        # Pushed data (traps) leaves this alone, so the next poll still lands on its slot
+        self._cancel_next_poll()
+        if self._stopped or (self.config_entry and self.config_entry.pref_disable_polling):
+            return
+        self._due = self.hass.loop.time() + delay
+        self._next_poll = self.hass.loop.call_at(self._due, self._handle_next_poll)
+
+    @callback
+    def _handle_next_poll(self):
+        self._next_poll = None
+        if not self.hass.is_stopping:
+            self._poll_task = self.hass.async_create_task(self.async_refresh(), f"{DOMAIN} {self.name} poll")
+
+    def _cancel_next_poll(self):
+        if self._next_poll is not None:
+            self._next_poll.cancel()
+            self._next_poll = None
+
+    async def async_shutdown(self):
+        self._stopped = True
+        self._cancel_next_poll()
+        if self._poll_task is not None and not self._poll_task.done():
+            self._poll_task.cancel()
+        await super().async_shutdown()
+
+
+class Deva4004MonitorCoordinator(Deva4004Coordinator):
+    # Each poll only reports the frequency the receiver is tuned to, so instead of waking
+    # every entity we mark each (frequency, field) that changed and only call the listeners
+    # whose context matches one of them
+    def __init__(self, hass: HomeAssistant, session: Deva4004Session, monitor_mode: str, update_interval: timedelta, scheduler: ScanScheduler | None = None, phase: float = 0.0, history: Deva4004History | None = None, aggregator: Deva4004Aggregator | None = None, breaker: Deva4004Breaker | None = None, store: Deva4004MonitoringStore | None = None):
+        super().__init__(hass, "sensor", update_interval, phase, metrics=session.metrics, breaker=breaker)
+        self.session = session
+        self.monitor_mode = monitor_mode
+        self.scheduler = scheduler
+        self.history = history
+        self.aggregator = aggregator
+        self.monitoring_data = store if store is not None else Deva4004MonitoringStore()
+        self._dirty = set()
+        self._notify_all = True
+
+    async def _async_poll(self):
+        try:
+            frequency, values = await _get_monitor_sample(self.session, BASE_OID_MONITORING, self.monitor_mode)
+        except Exception as e:
+            raise UpdateFailed(f"Update failed: {e}")
+
+        if frequency:
+            self._merge_sample(frequency, values)
+        else:
+            _LOGGER.debug("No frequency data received in this poll")
+
+        for expired in self.monitoring_data.expire(self.hass.loop.time()):
+            self._dirty.update((expired, field) for field in MONITOR_FIELDS)
+            _LOGGER.info("No data for frequency %s in %.0f s, marking it unavailable", expired, self.monitoring_data.ttl)
+
+        if self.aggregator and self.aggregator.due(self.hass.loop.time()):
+            self._close_window()
+
+        delay = None
+        if self.scheduler:
+            delay = self.scheduler.observe(frequency, self.hass.loop.time())
+            _LOGGER.debug("Next poll in %.2f s (tuned to %s)", delay, frequency)
+        # Readers get a frozen copy, never the store the next poll writes into
+        return self.monitoring_data.snapshot({key[0] for key in self._dirty}), delay
+
+    def _merge_sample(self, frequency, values):
+        if not self.monitoring_data.accepts(frequency):
+            _LOGGER.debug("Ignoring frequency %s, it is not in the channel table", frequency)
+            return
+        self.monitoring_data.seen(frequency, self.hass.loop.time())
+
+        record = self.monitoring_data.get(frequency)
+        if record is None:
+            # Availability of every entity on this frequency flips, not just the fields we got
+            record = self.monitoring_data[frequency] = {}
+            self._dirty.update((frequency, field) for field in MONITOR_FIELDS)
+            _LOGGER.info("New frequency detected: %s", frequency)
+
+        aggregator = self.aggregator
+        for field, value in values.items():
+            if aggregator and field in aggregator.policies:
+                aggregator.add(frequency, field, value)
+                if field in record:
+                    # Published when the window closes; the first sample goes out right away
+                    continue
+            if record.get(field, _MISSING) == value:
+                continue
+            record[field] = value
+            self._dirty.add((frequency, field))
+
+        if self.history:
+            # Every sample counts towards the statistics, including repeats of the last value,
+            # and moves the window the sensor's attributes are computed over
+            for field in MONITOR_LEVEL_FIELDS:
+                value = values.get(field)
+                if value is not None:
+                    self.history.record(frequency, field, value)
+                    self._dirty.add((frequency, field))
+
+    def _close_window(self):
+        for key, value in self.aggregator.close(self.hass.loop.time()).items():
+            record = self.monitoring_data.get(key[0])
+            if record is None:
+                continue
+            record[key[1]] = value
+            # The window statistics are new even when the published value repeats
+            self._dirty.add(key)
+
+    def set_channels(self, frequencies, ttl: float, scan_channels=None):
+        # Follow a changed channel table without a reload: entities of the frequencies
+        # dropped here are removed by the platform, the next poll's snapshot leaves them out
+        for frequency in self.monitoring_data.set_frequencies(frequencies, ttl):
+            self._dirty.update((frequency, field) for field in MONITOR_FIELDS)
+        if self.history:
+            self.history.set_frequencies(frequencies)
+        if self.aggregator:
+            self.aggregator.set_frequencies(frequencies)
+        if self.scheduler and scan_channels is not None:
+            self.scheduler.set_channels(scan_channels)
+
+    @callback
+    def async_update_listeners(self) -> None:
+        # A failed poll, or the first good one after it, changes availability for everyone
+        if not self.last_update_success or self._notify_all:
+            self._notify_all = not self.last_update_success
+            self._dirty.clear()
+            super().async_update_listeners()
+            return
+
+        dirty = self._dirty
+        self._dirty = set()
+        notified = 0
+        for update_callback, context in list(self._listeners.values()):
+            if context is None or context in dirty:
+                update_callback()
+                notified += 1
+        _LOGGER.debug("Notified %d of %d listeners (%d changed fields)", notified, len(self._listeners), len(dirty))
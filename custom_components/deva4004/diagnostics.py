@@ -0,0 +1,57 @@
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from .const import *
+
+TO_REDACT = {CONF_READ_COMMUNITY, CONF_WRITE_COMMUNITY, CONF_V3_AUTH_KEY, CONF_V3_PRIV_KEY}
+
+
+def _coordinator_diagnostics(coordinator):
+    return {
+        "last_update_success": coordinator.last_update_success,
+        "poll_interval": coordinator.poll_interval,
+        "phase": round(coordinator.phase, 3),
+        "lag": coordinator.lag,
+    }
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry):
+    diagnostics = {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+    }
+    entry_data = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if not entry_data:
+        return diagnostics
+
+    session = entry_data["session"]
+    coordinator = entry_data["coordinator"]
+    diagnostics["session"] = {
+        "snmp_version": session.version,
+        "max_var_binds": session.max_var_binds,
+        "transports_created": session.transports_created,
+        "transports_reused": session.transports_reused,
+    }
+    diagnostics["snmp"] = session.metrics.as_dict()
+    if "startup" in entry_data:
+        diagnostics["startup_ms"] = {
+            step: round(seconds * 1000, 1) if seconds is not None else None
+            for step, seconds in entry_data["startup"].items()
+        }
+    diagnostics["coordinators"] = {
+        "sensor": _coordinator_diagnostics(coordinator),
+        "alarms": _coordinator_diagnostics(entry_data["alarms_coordinator"]),
+    }
+    diagnostics["breaker"] = {"state": coordinator.breaker.state, **coordinator.breaker.stats()}
+    diagnostics["frequencies"] = {
+        "snapshot_version": coordinator.monitoring_data.version,
+        "ttl": coordinator.monitoring_data.ttl,
+        "last_seen_ago": coordinator.monitoring_data.ages(hass.loop.time()),
+    }
+    if coordinator.scheduler:
+        diagnostics["scan"] = coordinator.scheduler.stats()
+    if coordinator.history:
+        diagnostics["history_bytes"] = coordinator.history.memory
+    return diagnostics
@@ -0,0 +1,194 @@
+import math
+from array import array
+from .const import *
+
+
+class RingBuffer:
+    # Fixed-size window of float samples in a preallocated array. Sums are kept
+    # relative to the first sample so the variance stays accurate for levels that
+    # sit far from zero, and are recomputed from the window once per lap to shed
+    # floating point drift. min/max are only rescanned when the sample that leaves
+    # the window was the current extreme and the new one does not replace it.
+    __slots__ = ("size", "values", "count", "index", "_shift", "_sum", "_sum_squares", "_min", "_max", "_since_resync")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = array("d", bytes(8 * size))
+        self.count = 0
+        self.index = 0
+        self._shift = 0.0
+        self._sum = 0.0
+        self._sum_squares = 0.0
+        self._min = math.inf
+        self._max = -math.inf
+        self._since_resync = 0
+
+    def append(self, value: float):
+        if self.count == 0:
+            self._shift = value
+        shifted = value - self._shift
+
+        evicted = None
+        if self.count == self.size:
+            evicted = self.values[self.index]
+            evicted_shifted = evicted - self._shift
+            self._sum -= evicted_shifted
+            self._sum_squares -= evicted_shifted * evicted_shifted
+        else:
+            self.count += 1
+
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self._sum += shifted
+        self._sum_squares += shifted * shifted
+
+        # Everything else in the window is within [min, max], so a new sample at or beyond
+        # the extreme it replaces is the new extreme without a rescan
+        if evicted is not None and ((evicted == self._min and value > evicted) or (evicted == self._max and value < evicted)):
+            self._rescan_extremes()
+        else:
+            if value < self._min:
+                self._min = value
+            if value > self._max:
+                self._max = value
+
+        self._since_resync += 1
+        if self._since_resync >= self.size:
+            self._resync()
+
+    def _window(self):
+        if self.count < self.size:
+            return self.values[:self.count]
+        return self.values
+
+    def _rescan_extremes(self):
+        window = self._window()
+        self._min = min(window)
+        self._max = max(window)
+
+    def _resync(self):
+        window = self._window()
+        self._shift = sum(window) / self.count
+        self._sum = 0.0
+        self._sum_squares = 0.0
+        for value in window:
+            shifted = value - self._shift
+            self._sum += shifted
+            self._sum_squares += shifted * shifted
+        self._since_resync = 0
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return self._shift + self._sum / self.count
+
+    @property
+    def std_dev(self):
+        if not self.count:
+            return None
+        mean_shifted = self._sum / self.count
+        return math.sqrt(max(0.0, self._sum_squares / self.count - mean_shifted * mean_shifted))
+
+    def stats(self):
+        if not self.count:
+            return None
+        return {
+            "min": self._min,
+            "max": self._max,
+            "mean": round(self.mean, 2),
+            "std_dev": round(self.std_dev, 2),
+            "samples": self.count,
+        }
+
+
+class Deva4004History:
+    # One RingBuffer per (frequency, field), all allocated up front for the channel
+    # table, so memory is fixed by the table size and window length, not by uptime
+    def __init__(self, size: int, frequencies, fields):
+        self.size = size
+        self.fields = tuple(fields)
+        self.buffers = {
+            (frequency, field): RingBuffer(size)
+            for frequency in frequencies
+            for field in fields
+        }
+
+    def set_frequencies(self, frequencies):
+        # A changed channel table keeps the windows of the frequencies that stay
+        buffers = self.buffers
+        self.buffers = {
+            (frequency, field): buffers.get((frequency, field)) or RingBuffer(self.size)
+            for frequency in frequencies
+            for field in self.fields
+        }
+
+    def record(self, frequency, field, value):
+        buffer = self.buffers.get((frequency, field))
+        if buffer is not None:
+            buffer.append(value)
+
+    def stats(self, frequency, field):
+        buffer = self.buffers.get((frequency, field))
+        return buffer.stats() if buffer is not None else None
+
+    @property
+    def memory(self):
+        # Bytes held by the sample arrays
+        return sum(buffer.values.itemsize * buffer.size for buffer in self.buffers.values())
+
+
+class Deva4004Aggregator:
+    # Folds every level sample into a running count/sum/min/max per (frequency, field)
+    # and closes the window on the loop clock every `window` seconds. Each closed window
+    # yields one value per key, picked by the field's policy, and keeps the window's
+    # min/max/mean so peaks survive whichever policy is published
+    def __init__(self, window: float, policies: dict):
+        self.window = window
+        self.policies = policies
+        self.window_end = None
+        self._open = {}
+        self._closed = {}
+
+    def add(self, frequency, field, value):
+        accumulator = self._open.get((frequency, field))
+        if accumulator is None:
+            self._open[(frequency, field)] = [1, value, value, value]
+            return
+        accumulator[0] += 1
+        accumulator[1] += value
+        if value < accumulator[2]:
+            accumulator[2] = value
+        if value > accumulator[3]:
+            accumulator[3] = value
+
+    def due(self, now: float) -> bool:
+        if self.window_end is None:
+            self.window_end = (now // self.window + 1) * self.window
+        return now >= self.window_end
+
+    def close(self, now: float):
+        # Returns {(frequency, field): published value} for the keys sampled in the window
+        published = {}
+        for key, (count, total, low, high) in self._open.items():
+            mean = round(total / count, 2)
+            policy = self.policies[key[1]]
+            published[key] = low if policy == AGGREGATION_MIN else high if policy == AGGREGATION_MAX else mean
+            self._closed[key] = {
+                "window_min": low,
+                "window_max": high,
+                "window_mean": mean,
+                "window_samples": count,
+            }
+        self._open = {}
+        self.window_end = (now // self.window + 1) * self.window
+        return published
+
+    def set_frequencies(self, frequencies):
+        # Forget the frequencies a changed channel table dropped, open window included
+        frequencies = set(frequencies)
+        self._open = {key: value for key, value in self._open.items() if key[0] in frequencies}
+        self._closed = {key: value for key, value in self._closed.items() if key[0] in frequencies}
+
+    def stats(self, frequency, field):
+        return self._closed.get((frequency, field))
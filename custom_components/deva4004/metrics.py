@@ -0,0 +1,263 @@
+import math
+import time
+from datetime import datetime, timezone
+from array import array
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from .const import *
+
+# Upper bounds (seconds) of the latency buckets: 1 ms to ~70 s in 25 % steps, so a
+# percentile read from the buckets is within a quarter of the real value
+LATENCY_BUCKETS = tuple(0.001 * 1.25 ** n for n in range(51))
+
+# The poll whose SNMP operations are being counted; asyncio tasks started inside the
+# poll (gather) inherit it, so concurrent walks still land on the right poll
+_current_poll = ContextVar("deva4004_poll", default=None)
+
+
+class Histogram:
+    # Bucket counts plus a running sum. Everything is halved once `decay` samples have
+    # accumulated, so percentiles follow the last few hundred samples at a fixed cost
+    __slots__ = ("counts", "total", "sum", "decay")
+
+    def __init__(self, decay: int = METRICS_DECAY_SAMPLES):
+        self.counts = array("d", bytes(8 * (len(LATENCY_BUCKETS) + 1)))
+        self.total = 0.0
+        self.sum = 0.0
+        self.decay = decay
+
+    def record(self, value: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def halve(self):
+        counts = self.counts
+        for index in range(len(counts)):
+            counts[index] *= 0.5
+        self.total *= 0.5
+        self.sum *= 0.5
+
+    def percentile(self, q: float):
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0.0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return LATENCY_BUCKETS[min(index, len(LATENCY_BUCKETS) - 1)]
+        return LATENCY_BUCKETS[-1]
+
+
+class _Counters:
+    # Decaying counters of one kind of SNMP operation or poll, halved together with
+    # their latency histogram so the rates stay consistent with each other
+    __slots__ = ("count", "errors", "timeouts", "pdus", "var_binds", "retries", "latency")
+
+    def __init__(self):
+        self.count = 0.0
+        self.errors = 0.0
+        self.timeouts = 0.0
+        self.pdus = 0.0
+        self.var_binds = 0.0
+        self.retries = 0.0
+        self.latency = Histogram()
+
+    def record(self, elapsed, error, timed_out, pdus, var_binds, retries):
+        if self.latency.total >= self.latency.decay:
+            self.count *= 0.5
+            self.errors *= 0.5
+            self.timeouts *= 0.5
+            self.pdus *= 0.5
+            self.var_binds *= 0.5
+            self.retries *= 0.5
+            self.latency.halve()
+        self.count += 1
+        if error:
+            self.errors += 1
+        if timed_out:
+            self.timeouts += 1
+        self.pdus += pdus
+        self.var_binds += var_binds
+        self.retries += retries
+        self.latency.record(elapsed)
+
+    def stats(self):
+        if not self.count:
+            return None
+        latency = self.latency
+        return {
+            "p50": _ms(latency.percentile(0.5)),
+            "p95": _ms(latency.percentile(0.95)),
+            "mean": _ms(latency.sum / latency.total),
+            "error_rate": round(self.errors / self.count * 100, 1),
+            "timeout_rate": round(self.timeouts / self.count * 100, 1),
+            "pdus": round(self.pdus / self.count, 2),
+            "var_binds": round(self.var_binds / self.count, 2),
+            "retries": round(self.retries / self.count, 2),
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class Operation:
+    # One SNMP get/walk in flight; the retrieval functions count PDUs and var-binds
+    # into it as responses arrive
+    __slots__ = ("kind", "started", "start", "timeout", "retries", "pdus", "var_binds")
+
+    def __init__(self, kind: str, timeout: float, retries: int):
+        self.kind = kind
+        self.started = time.time()
+        self.start = time.monotonic()
+        self.timeout = timeout
+        self.retries = retries
+        self.pdus = 0
+        self.var_binds = 0
+
+    def response(self, var_binds):
+        self.pdus += 1
+        self.var_binds += len(var_binds)
+
+
+class RttEstimator:
+    # SRTT/RTTVAR as in RFC 6298, fed with the per-PDU time of requests that were
+    # answered before their first timeout (Karn: a retransmitted request's answer
+    # could belong to either send)
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.rto = RTO_INITIAL
+        self.samples = 0
+        self.backoffs = 0
+
+    def sample(self, rtt: float):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar += RTT_BETA * (abs(self.srtt - rtt) - self.rttvar)
+            self.srtt += RTT_ALPHA * (rtt - self.srtt)
+        self.rto = min(RTO_MAX, max(RTO_MIN, self.srtt + 4 * self.rttvar))
+        self.samples += 1
+
+    def backoff(self):
+        self.rto = min(RTO_MAX, self.rto * 2)
+        self.backoffs += 1
+
+    @property
+    def timeout(self):
+        steps = math.ceil(2 * math.log2(self.rto / RTO_MIN) - 1e-9)
+        return min(RTO_MAX, round(RTO_MIN * 2 ** (steps / 2), 3))
+
+    def stats(self):
+        return {
+            "srtt_ms": _ms(self.srtt),
+            "rttvar_ms": _ms(self.rttvar),
+            "rto": round(self.rto, 3),
+            "timeout": self.timeout,
+            "samples": self.samples,
+            "backoffs": self.backoffs,
+        }
+
+
+def poll_budget():
+    # Seconds the current poll's requests may spend waiting for answers
+    poll = _current_poll.get()
+    return poll.budget if poll is not None else SNMP_SETUP_BUDGET
+
+
+class _Poll:
+    __slots__ = ("start", "budget", "pdus", "var_binds", "retries", "errors", "timeouts")
+
+    def __init__(self, budget: float):
+        self.start = time.monotonic()
+        self.budget = budget
+        self.pdus = 0
+        self.var_binds = 0
+        self.retries = 0
+        self.errors = 0
+        self.timeouts = 0
+
+
+class Deva4004Metrics:
+    # Per-device latency/error accounting for every SNMP operation and every
+    # coordinator poll, cheap enough to stay on: a few slot writes and one bisect
+    def __init__(self):
+        self.operations = {}
+        self.polls = {}
+        self.recent = deque(maxlen=METRICS_RECENT_OPERATIONS)
+        self.rtt = RttEstimator()
+
+    def start(self, kind: str, timeout: float, retries: int) -> Operation:
+        return Operation(kind, timeout, retries)
+
+    def finish(self, operation: Operation, error=None, timed_out: bool = False):
+        elapsed = time.monotonic() - operation.start
+        # pysnmp retransmits internally without telling us; every full timeout that
+        # passed before an answer (or before giving up) was a retry
+        per_pdu = elapsed / operation.pdus if operation.pdus else elapsed
+        retries = operation.retries if timed_out else min(operation.retries, int(per_pdu // operation.timeout))
+        counters = self.operations.get(operation.kind)
+        if counters is None:
+            counters = self.operations[operation.kind] = _Counters()
+        counters.record(elapsed, error, timed_out, operation.pdus, operation.var_binds, retries)
+
+        if timed_out:
+            self.rtt.backoff()
+        elif operation.pdus and not retries:
+            self.rtt.sample(per_pdu)
+
+        poll = _current_poll.get()
+        if poll is not None:
+            poll.pdus += operation.pdus
+            poll.var_binds += operation.var_binds
+            poll.retries += retries
+            if error:
+                poll.errors += 1
+            if timed_out:
+                poll.timeouts += 1
+
+        self.recent.append((operation.kind, operation.started, elapsed, operation.pdus, operation.var_binds, retries, str(error) if error else None))
+
+    def begin_poll(self, budget: float):
+        poll = _Poll(budget)
+        return poll, _current_poll.set(poll)
+
+    def end_poll(self, name: str, started, failed: bool) -> bool:
+        # A poll fails when it raised or when any of its SNMP operations reported an
+        # error, as some errors (a timed out monitoring GET) only leave the data empty.
+        # Returns whether the device looked unreachable: the poll raised or timed out
+        poll, token = started
+        _current_poll.reset(token)
+        counters = self.polls.get(name)
+        if counters is None:
+            counters = self.polls[name] = _Counters()
+        counters.record(time.monotonic() - poll.start, failed or poll.errors, poll.timeouts, poll.pdus, poll.var_binds, poll.retries)
+        return failed or poll.timeouts > 0
+
+    def poll_stats(self, name: str):
+        counters = self.polls.get(name)
+        return counters.stats() if counters is not None else None
+
+    def as_dict(self):
+        return {
+            "rtt": self.rtt.stats(),
+            "polls": {name: counters.stats() for name, counters in self.polls.items()},
+            "operations": {kind: counters.stats() for kind, counters in self.operations.items()},
+            "recent_operations": [
+                {
+                    "kind": kind,
+                    "started": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+                    "elapsed_ms": _ms(elapsed),
+                    "pdus": pdus,
+                    "var_binds": var_binds,
+                    "retries": retries,
+                    "error": error,
+                }
+                for kind, started, elapsed, pdus, var_binds, retries, error in self.recent
+            ],
+        }
@@ -0,0 +1,86 @@
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+class Deva4004MonitoringStore(dict):
+    # frequency -> {field: value}, as the monitoring entities read it, limited to the
+    # frequencies in the channel table and stamped with the loop time each was last
+    # reported. A frequency not reported for `ttl` seconds is dropped, so its entities
+    # go unavailable instead of showing their last levels forever, and the store never
+    # holds more than the table
+    def __init__(self, frequencies=None, ttl: float | None = None):
+        super().__init__()
+        self.frequencies = frozenset(frequencies) if frequencies is not None else None
+        self.ttl = ttl
+        self.last_seen = {}
+        self.version = 0
+        self._snapshot = Deva4004Snapshot({}, 0)
+
+    def set_frequencies(self, frequencies, ttl: float | None):
+        # The channel table changed: drop what belongs to frequencies no longer in it
+        # and return those frequencies
+        self.frequencies = frozenset(frequencies)
+        self.ttl = ttl
+        dropped = [frequency for frequency in self.last_seen if frequency not in self.frequencies]
+        for frequency in dropped:
+            del self.last_seen[frequency]
+            self.pop(frequency, None)
+        return dropped
+
+    def accepts(self, frequency) -> bool:
+        return self.frequencies is None or frequency in self.frequencies
+
+    def seen(self, frequency, now: float):
+        self.last_seen[frequency] = now
+
+    def expire(self, now: float):
+        # Returns the frequencies dropped for going stale
+        if self.ttl is None:
+            return []
+        expired = [frequency for frequency, seen in self.last_seen.items() if now - seen > self.ttl]
+        for frequency in expired:
+            del self.last_seen[frequency]
+            self.pop(frequency, None)
+        return expired
+
+    def ages(self, now: float):
+        return {frequency: round(now - seen, 1) for frequency, seen in self.last_seen.items()}
+
+    def snapshot(self, changed) -> "Deva4004Snapshot":
+        # Freezes the store for the coordinator's data. Only the frequencies in `changed`
+        # are copied; the others keep the frozen record of the previous snapshot, and a
+        # poll that changed nothing returns the previous snapshot itself
+        previous = self._snapshot
+        if not changed:
+            return previous
+        records = {}
+        for frequency, record in self.items():
+            frozen = previous.get(frequency)
+            if frozen is None or frequency in changed:
+                frozen = MappingProxyType(dict(record))
+            records[frequency] = frozen
+        self.version += 1
+        self._snapshot = Deva4004Snapshot(records, self.version)
+        return self._snapshot
+
+
+class Deva4004Snapshot(Mapping):
+    # Read-only frequency -> read-only record view of one poll, numbered so consumers
+    # can tell polls apart by version (or identity) without comparing the contents
+    __slots__ = ("version", "_records")
+
+    def __init__(self, records: dict, version: int):
+        self._records = records
+        self.version = version
+
+    def __getitem__(self, frequency):
+        return self._records[frequency]
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __repr__(self):
+        return f"Deva4004Snapshot(version={self.version}, frequencies={sorted(self._records)})"
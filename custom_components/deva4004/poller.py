@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, callback
+from .const import *
+
+if TYPE_CHECKING:
+    from pysnmp.hlapi.v3arch.asyncio import SnmpEngine
+
+_LOGGER = logging.getLogger(__name__)
+
+# Golden-ratio steps spread any number of devices evenly over the poll interval
+# without moving the devices that are already registered
+_PHASE_STEP = 0.6180339887498949
+
+
+class Deva4004Poller:
+    # One per Home Assistant instance: every entry polls through the same SnmpEngine,
+    # under a fleet-wide in-flight cap, at its own phase within the poll interval
+    def __init__(self, engine: "SnmpEngine", max_in_flight: int = FLEET_MAX_IN_FLIGHT):
+        self.engine = engine
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.slots = {}
+
+    def register(self, entry_id: str) -> float:
+        if entry_id not in self.slots:
+            used = set(self.slots.values())
+            self.slots[entry_id] = next(slot for slot in range(len(used) + 1) if slot not in used)
+        return self.phase(entry_id)
+
+    def phase(self, entry_id: str) -> float:
+        return (self.slots[entry_id] * _PHASE_STEP) % 1
+
+    def unregister(self, entry_id: str):
+        self.slots.pop(entry_id, None)
+
+
+def _create_engine():
+    # pysnmp is only imported here, in the executor, so loading the integration does not
+    # pay for it on the event loop; SnmpEngine also loads MIB modules from disk
+    start = time.perf_counter()
+    from pysnmp.hlapi.v3arch.asyncio import SnmpEngine
+    engine = SnmpEngine()
+    return engine, time.perf_counter() - start
+
+
+async def async_get_engine(hass: HomeAssistant) -> "SnmpEngine":
+    # The one SnmpEngine of the integration, shared by config flows and entries. It is
+    # created on first use (async_setup starts that in the background) and only closed
+    # when Home Assistant stops: reloads and flows in progress keep using the same one.
+    # Concurrent callers wait for the same construction
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    engine = domain_data.get("engine")
+    if engine is not None:
+        return engine
+
+    pending = domain_data.get("engine_pending")
+    if pending is None:
+        pending = domain_data["engine_pending"] = hass.async_add_executor_job(_create_engine)
+    try:
+        engine, elapsed = await pending
+    finally:
+        if domain_data.get("engine_pending") is pending:
+            del domain_data["engine_pending"]
+    if "engine" in domain_data:
+        return domain_data["engine"]
+    domain_data["engine"] = engine
+    domain_data["engine_created_in"] = elapsed
+
+    @callback
+    def close_engine(event):
+        if domain_data.get("engine") is engine:
+            engine.close_dispatcher()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, close_engine)
+    _LOGGER.debug("Created shared SNMP engine in %.3f s", elapsed)
+    return engine
+
+
+async def async_create_engine(hass: HomeAssistant) -> "SnmpEngine":
+    # An SnmpEngine of its own for an SNMPv3 user: pysnmp keeps USM users per engine by
+    # user name, so entries with the same user name but other keys cannot share one.
+    # The caller closes it
+    engine, elapsed = await hass.async_add_executor_job(_create_engine)
+    _LOGGER.debug("Created SNMP engine for an SNMPv3 user in %.3f s", elapsed)
+    return engine
+
+
+async def async_get_poller(hass: HomeAssistant, entry_id: str) -> Deva4004Poller:
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    poller = domain_data.get("poller")
+    if poller is None:
+        engine = await async_get_engine(hass)
+        poller = domain_data.get("poller")
+        if poller is None:
+            poller = domain_data["poller"] = Deva4004Poller(engine)
+            _LOGGER.debug("Created shared SNMP poller")
+    poller.register(entry_id)
+    return poller
+
+
+@callback
+def async_release_poller(hass: HomeAssistant, entry_id: str):
+    domain_data = hass.data.get(DOMAIN, {})
+    poller = domain_data.get("poller")
+    if poller is None:
+        return
+    poller.unregister(entry_id)
+    if not poller.slots:
+        # The engine stays for the next entry or flow
+        domain_data.pop("poller", None)
+        _LOGGER.debug("Released shared SNMP poller")
@@ -0,0 +1,125 @@
+import logging
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ScanScheduler:
+    # The receiver dwells on each active channel for its acq_time before moving on.
+    # Rather than polling on a fixed tick, place one poll shortly after each predicted
+    # switch: dwell times start from acq_time and are refined from the switches we see.
+    def __init__(self, channels, fallback_interval: float, settle: float = SCAN_SETTLE_TIME, min_interval: float = SCAN_MIN_INTERVAL):
+        # channels: (frequency, acq_time) pairs of the active channels in scan order
+        self.sequence = [frequency for frequency, _ in channels]
+        self.acq_times = {frequency: float(acq_time) for frequency, acq_time in channels}
+        self.dwell = {frequency: max(acq_time, min_interval) for frequency, acq_time in self.acq_times.items()}
+        self.fallback_interval = fallback_interval
+        self.settle = settle
+        self.min_interval = min_interval
+        self.transitions = {}
+        self.current = None
+        self.switched_at = None
+        self.last_poll = None
+        self.polls = 0
+        self.visits = 0
+        self.missed = 0
+
+    def set_channels(self, channels):
+        # A changed channel table: learned dwell times are kept for the channels whose
+        # acq_time did not change, the others start over from the table
+        acq_times = {frequency: float(acq_time) for frequency, acq_time in channels}
+        self.dwell = {
+            frequency: self.dwell[frequency]
+            if self.acq_times.get(frequency) == acq_time and frequency in self.dwell
+            else max(acq_time, self.min_interval)
+            for frequency, acq_time in acq_times.items()
+        }
+        self.acq_times = acq_times
+        self.sequence = [frequency for frequency, _ in channels]
+        self.transitions = {}
+
+    @property
+    def cycle_time(self):
+        return sum(self.dwell.values())
+
+    @property
+    def samples_per_cycle(self):
+        if not self.visits or not self.sequence:
+            return None
+        return round(self.polls * len(self.sequence) / self.visits, 2)
+
+    @property
+    def missed_channel_rate(self):
+        if not self.visits:
+            return None
+        return round(self.missed / self.visits, 3)
+
+    def _hops(self, previous, frequency):
+        # Channels skipped between two observed frequencies, following the channel order
+        if previous not in self.sequence or frequency not in self.sequence:
+            return 1
+        return (self.sequence.index(frequency) - self.sequence.index(previous)) % len(self.sequence) or len(self.sequence)
+
+    def observe(self, frequency, now: float) -> float:
+        # Record the frequency reported by a poll at monotonic time `now` and return
+        # how many seconds to wait before the next poll
+        if frequency is None:
+            self.last_poll = now
+            return self.fallback_interval
+
+        self.polls += 1
+        if frequency != self.current:
+            switched_at = self._estimate_switch(now)
+            if self.current is not None:
+                hops = self._hops(self.current, frequency)
+                self.visits += hops
+                self.missed += hops - 1
+                self.transitions[self.current] = frequency
+                if self.switched_at is not None and hops == 1:
+                    self._learn_dwell(self.current, switched_at - self.switched_at)
+                self.switched_at = switched_at
+            self.current = frequency
+        self.last_poll = now
+
+        if self.switched_at is None:
+            # No switch observed yet: poll quickly until we find a boundary to align to
+            return self.min_interval
+
+        dwell = self.dwell.get(frequency, self.fallback_interval)
+        delay = self.switched_at + dwell + self.settle - now
+        if delay < self.min_interval:
+            # Past the predicted switch and still on the same channel; check again soon
+            return self.min_interval
+        return delay
+
+    def _estimate_switch(self, now: float) -> float:
+        # The switch happened between the previous poll and this one. Once we have a
+        # prediction the poll was aimed `settle` after it, so only the last 2 * settle
+        # of that window is plausible.
+        if self.last_poll is None:
+            return now
+        earliest = self.last_poll
+        if self.switched_at is not None and self.current in self.dwell:
+            earliest = max(earliest, self.switched_at + self.dwell[self.current] - self.settle)
+        earliest = min(earliest, now)
+        return earliest + SCAN_SWITCH_ESTIMATE * (now - earliest)
+
+    def _learn_dwell(self, frequency, measured: float):
+        expected = self.dwell.get(frequency)
+        if expected is None:
+            self.dwell[frequency] = measured
+            return
+        # Ignore measurements that cannot be one dwell (a stalled or restarted scan)
+        if not 0.5 * expected <= measured <= 2 * expected:
+            _LOGGER.debug("Ignoring dwell of %.2f s on %s (expected %.2f s)", measured, frequency, expected)
+            return
+        self.dwell[frequency] = expected + SCAN_DWELL_SMOOTHING * (measured - expected)
+
+    def stats(self):
+        return {
+            "samples_per_cycle": self.samples_per_cycle,
+            "missed_channel_rate": self.missed_channel_rate,
+            "cycle_time": round(self.cycle_time, 2),
+            "channels": len(self.sequence),
+            "polls": self.polls,
+        }
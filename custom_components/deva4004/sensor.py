@@ -1,138 +1,403 @@
+import asyncio
 import logging
 import re
 from datetime import timedelta
 from homeassistant.components.sensor import SensorEntity
+from homeassistant.const import EntityCategory
 from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers import device_registry as dr, entity_registry as er
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed, CoordinatorEntity
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry
-from pysnmp.hlapi.v3arch.asyncio import SnmpEngine
-from .snmp_data import _get_monitor_data, _get_alarms_data, _get_logger_data
+from .snmp_data import (
+    Deva4004Session,
+    MONITOR_LEVEL_FIELDS,
+    _decode_alarm_var_binds,
+    _get_alarms_data,
+    _get_logger_data,
+    _probe,
+)
+from .trap import async_register_trap_handler
+from .breaker import Deva4004Breaker
+from .cache import Deva4004ChannelCache
+from .coordinator import Deva4004Coordinator, Deva4004MonitorCoordinator
+from .poller import async_create_engine, async_get_poller, async_release_poller
+from .history import Deva4004Aggregator, Deva4004History
+from .monitoring import Deva4004MonitoringStore
+from .scheduler import ScanScheduler
 from .const import *
 
 _LOGGER = logging.getLogger(__name__)
 
 
-async def update_listener(hass, entry):
-    _LOGGER.debug("update_listener called with data interval: %s", entry.options.get(CONF_POLL_INTERVAL_DATA))
-    coordinators = hass.data[DOMAIN][entry.entry_id]
-    await coordinators["coordinator"].async_set_update_interval(timedelta(seconds=entry.options.get(CONF_POLL_INTERVAL_DATA)))
-    await coordinators["alarms_coordinator"].async_set_update_interval(timedelta(seconds=entry.options.get(CONF_POLL_INTERVAL_ALARMS)))
-
-
 async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry, async_add_entities):
     ip_address = config_entry.data.get("ip_address")
     port = config_entry.data.get("port")
     read_community = config_entry.data.get("read_community")
     instance_name = config_entry.data.get("name")
 
-    engine = await hass.async_add_executor_job(SnmpEngine)
-
-    try:
-        data = await _get_logger_data(engine, ip_address, port, read_community)
-    except Exception as e:
-        raise ConfigEntryNotReady(f"Failed to fetch device data from {ip_address}: {e}") from e
-
-    monitoring_data = {}
+    poller = await async_get_poller(hass, config_entry.entry_id)
+    config_entry.async_on_unload(lambda: async_release_poller(hass, config_entry.entry_id))
+    max_in_flight = config_entry.options.get(CONF_MAX_IN_FLIGHT, DEFAULT_MAX_IN_FLIGHT)
+    snmp_version = config_entry.data.get(CONF_SNMP_VERSION, DEFAULT_SNMP_VERSION)
+    engine = poller.engine
+    if snmp_version == SNMP_VERSION_3:
+        engine = await async_create_engine(hass)
+        config_entry.async_on_unload(engine.close_dispatcher)
+    session = Deva4004Session(
+        engine,
+        ip_address,
+        port,
+        read_community,
+        max_in_flight,
+        poller.in_flight,
+        snmp_version,
+        config_entry.data,
+    )
 
-    async def async_update_data():
+    cache = Deva4004ChannelCache(hass, config_entry.entry_id)
+    # A new entry comes with the channel table its config flow has just read
+    channels = hass.data[DOMAIN].get("channel_handover", {}).pop(config_entry.unique_id, None)
+    handed_over = channels is not None
+    if handed_over:
+        await cache.async_update(channels)
+    else:
+        channels = await cache.async_load()
+    cached = not handed_over and channels is not None
+    if handed_over:
+        _LOGGER.debug("Using the channel table read by the config flow for %s (%d channels)", ip_address, len(channels))
+    elif cached:
+        _LOGGER.debug("Using cached channel table for %s (%d channels)", ip_address, len(channels))
+    else:
         try:
-            return await _get_monitor_data(engine, ip_address, port, read_community, BASE_OID_MONITORING, monitoring_data)
+            channels, errors = await _get_logger_data(session)
         except Exception as e:
-            raise UpdateFailed(f"Update failed: {e}")
+            raise ConfigEntryNotReady(f"Failed to fetch device data from {ip_address}: {e}") from e
+        if not errors and channels:
+            await cache.async_update(channels)
+
+    monitor_mode = config_entry.options.get(CONF_MONITOR_MODE, DEFAULT_MONITOR_MODE)
 
     async def async_update_alarms_data():
         try:
-            return await _get_alarms_data(engine, ip_address, port, read_community)
+            return await _get_alarms_data(session)
         except Exception as e:
             raise UpdateFailed(f"Update failed: {e}")
 
+    @callback
+    def handle_trap(var_binds):
+        alarms = _decode_alarm_var_binds(var_binds)
+        if not alarms or alarms_coordinator.data is None:
+            # Not an alarm table change we can apply, so let a poll pick it up
+            hass.async_create_task(alarms_coordinator.async_request_refresh())
+            return
+        data = {channel: dict(values) for channel, values in alarms_coordinator.data.items()}
+        for channel, values in alarms.items():
+            data.setdefault(channel, {}).update(values)
+        _LOGGER.debug("Applied alarm trap from %s: %s", ip_address, alarms)
+        alarms_coordinator.async_set_updated_data(data)
+
     data_update_interval = config_entry.options.get(CONF_POLL_INTERVAL_DATA, DEFAULT_POLL_INTERVAL_DATA)
     alarms_update_interval = config_entry.options.get(CONF_POLL_INTERVAL_ALARMS, DEFAULT_POLL_INTERVAL_ALARMS)
+    if config_entry.options.get(CONF_TRAP_ENABLED, DEFAULT_TRAP_ENABLED) and snmp_version == SNMP_VERSION_3:
+        # The listener only checks v1/v2c communities; it has no USM to authenticate v3 notifications
+        _LOGGER.warning("SNMP traps are not supported with SNMPv3, polling the alarms of %s instead", instance_name)
+    elif config_entry.options.get(CONF_TRAP_ENABLED, DEFAULT_TRAP_ENABLED):
+        trap_port = config_entry.options.get(CONF_TRAP_PORT, DEFAULT_TRAP_PORT)
+        try:
+            config_entry.async_on_unload(await async_register_trap_handler(hass, trap_port, ip_address, read_community, handle_trap))
+            alarms_update_interval = max(alarms_update_interval, TRAP_RECONCILE_INTERVAL)
+        except OSError as e:
+            _LOGGER.error("Cannot listen for SNMP traps on port %s, polling alarms instead: %s", trap_port, e)
+
+    scheduler = None
+    active_channels = _active_channels(channels)
+    if config_entry.options.get(CONF_POLL_MODE, DEFAULT_POLL_MODE) == POLL_MODE_SCAN:
+        scheduler = ScanScheduler(_scan_channels(active_channels), data_update_interval)
+
+    history = None
+    history_size = config_entry.options.get(CONF_HISTORY_SIZE, DEFAULT_HISTORY_SIZE)
+    if history_size:
+        history = Deva4004History(
+            history_size,
+            [str(device_data["frequency"]) for device_data in active_channels],
+            MONITOR_LEVEL_FIELDS,
+        )
+
+    aggregator = None
+    aggregation_window = config_entry.options.get(CONF_AGGREGATION_WINDOW, DEFAULT_AGGREGATION_WINDOW)
+    if aggregation_window:
+        aggregator = Deva4004Aggregator(
+            aggregation_window,
+            {
+                field: config_entry.options.get(CONF_AGGREGATION_POLICY[field], DEFAULT_AGGREGATION_POLICY[field])
+                for field in MONITOR_LEVEL_FIELDS
+            },
+        )
+
+    breaker = Deva4004Breaker(ip_address, lambda: _probe(session))
+    store = Deva4004MonitoringStore(
+        [str(device_data["frequency"]) for device_data in active_channels],
+        _monitor_ttl(active_channels, data_update_interval),
+    )
 
-    coordinator = DataUpdateCoordinator(
+    phase = poller.phase(config_entry.entry_id)
+    coordinator = Deva4004MonitorCoordinator(
         hass,
-        _LOGGER,
-        name="sensor",
-        update_method=async_update_data,
-        update_interval=timedelta(seconds=data_update_interval),
+        session,
+        monitor_mode,
+        timedelta(seconds=data_update_interval),
+        scheduler,
+        phase,
+        history,
+        aggregator,
+        breaker,
+        store,
     )
 
-    alarms_coordinator = DataUpdateCoordinator(
+    alarms_coordinator = Deva4004Coordinator(
         hass,
-        _LOGGER,
-        name="alarms",
-        update_method=async_update_alarms_data,
-        update_interval=timedelta(seconds=alarms_update_interval),
+        "alarms",
+        timedelta(seconds=alarms_update_interval),
+        phase,
+        async_update_alarms_data,
+        session.metrics,
+        breaker,
     )
 
-    if DOMAIN not in hass.data:
-        hass.data[DOMAIN] = {}
-
     hass.data[DOMAIN][config_entry.entry_id] = {
         "coordinator": coordinator,
         "alarms_coordinator": alarms_coordinator,
-        "engine": engine,
+        "poller": poller,
+        "session": session,
     }
 
-    await coordinator.async_refresh()
-    await alarms_coordinator.async_refresh()
+    channel_entities = {}
+
+    def build_channel_entities(device_data):
+        channel = Deva4004Channel(device_data, instance_name, ip_address)
+        entities = [sensor_class(coordinator, channel) for sensor_class in CHANNEL_SENSORS]
+        entities.extend(sensor_class(alarms_coordinator, channel) for sensor_class in ALARM_SENSORS)
+        channel_entities[device_data["channel_number"]] = entities
+        return entities
+
+    def build_receiver_entities(device_data):
+        # Every row carries the receiver's firmware and serial, any one will do
+        receiver = Deva4004Channel(device_data, instance_name, ip_address)
+        receiver_id = str(receiver.serial_number or config_entry.entry_id)
+        receiver_entities.append(Deva4004PollLagSensor(coordinator, receiver, receiver_id, alarms_coordinator))
+        receiver_entities.extend(sensor_class(coordinator, receiver, receiver_id) for sensor_class in POLL_METRIC_SENSORS)
+        receiver_entities.append(Deva4004BreakerSensor(coordinator, receiver, receiver_id))
+        if scheduler:
+            receiver_entities.append(Deva4004ScanSensor(coordinator, receiver, receiver_id))
+        return receiver_entities
+
+    async def async_apply_channels(fresh):
+        # Swap the entities of the channels that changed and leave every other one alone.
+        # A row that changed but kept its unique IDs (retuned, new acq_time) gets new
+        # entity objects under the same registry entries; IDs that are gone (renamed,
+        # switched off, removed) leave the registry, and so do their devices
+        nonlocal channels
+        current = {device_data["channel_number"]: device_data for device_data in _active_channels(channels)}
+        wanted = {device_data["channel_number"]: device_data for device_data in _active_channels(fresh)}
+        stale = [entity for number, device_data in current.items() if wanted.get(number) != device_data for entity in channel_entities.pop(number, ())]
+        added = [entity for number, device_data in wanted.items() if current.get(number) != device_data for entity in build_channel_entities(device_data)]
+
+        active = list(wanted.values())
+        coordinator.set_channels(
+            [str(device_data["frequency"]) for device_data in active],
+            _monitor_ttl(active, data_update_interval),
+            _scan_channels(active),
+        )
+
+        entity_registry = er.async_get(hass)
+        device_registry = dr.async_get(hass)
+        kept_ids = {entity.unique_id for entity in added}
+        kept_devices = {identifier for entity in added for identifier in entity.device_info["identifiers"]}
+        for entity in stale:
+            if entity.hass is not None:
+                await entity.async_remove(force_remove=True)
+            entity_id = entity_registry.async_get_entity_id("sensor", DOMAIN, entity.unique_id)
+            if entity_id and entity.unique_id not in kept_ids:
+                entity_registry.async_remove(entity_id)
+        for identifiers in {frozenset(entity.device_info["identifiers"]) for entity in stale}:
+            device = device_registry.async_get_device(identifiers=set(identifiers))
+            if device and not identifiers & kept_devices:
+                device_registry.async_update_device(device.id, remove_config_entry_id=config_entry.entry_id)
+
+        if receiver_entities and fresh:
+            # A firmware upgrade (or a swapped unit) shows on the receiver device too
+            identity = {"sw_version": fresh[0]["fw_version"], "hw_version": fresh[0]["serial_number"]}
+            device = device_registry.async_get_device(identifiers=receiver_entities[0].device_info["identifiers"])
+            if device and any(getattr(device, key) != value for key, value in identity.items()):
+                device_registry.async_update_device(device.id, **identity)
+        elif fresh:
+            # The table was empty at setup, so the receiver had no identity to hang its sensors on
+            async_add_entities(build_receiver_entities(fresh[0]))
+        async_add_entities(added)
+        channels = fresh
+        await cache.async_update(fresh)
+        _LOGGER.info(
+            "Channel table of %s changed: %d channels updated, %d entities removed, %d added",
+            instance_name, len({entity.channel.channel_id for entity in stale + added}), len(stale), len(added),
+        )
+
+    revalidating = asyncio.Lock()
+    receiver_entities = []
+
+    async def async_revalidate_channels():
+        # The same reads as setup; rows are compared directly and only swapped when they differ
+        if revalidating.locked() or breaker.state == BREAKER_OPEN:
+            return
+        async with revalidating:
+            try:
+                fresh, errors = await _get_logger_data(session)
+            except Exception as e:
+                _LOGGER.debug("Could not revalidate channel table for %s: %s", ip_address, e)
+                return
+            # A partial read is not a reason to throw away a good table
+            if errors or not fresh or fresh == channels:
+                return
+            await async_apply_channels(fresh)
+
+    @callback
+    def schedule_revalidation(now):
+        config_entry.async_create_background_task(hass, async_revalidate_channels(), f"{DOMAIN} revalidate channels")
+
+    config_entry.async_on_unload(
+        async_track_time_interval(hass, schedule_revalidation, timedelta(seconds=CHANNEL_REVALIDATE_INTERVAL))
+    )
+
+    if cached:
+        # Entities come up from the cache straight away; the first polls and the check
+        # that the device still has this table (started once the entities are added) follow
+        hass.data[DOMAIN][config_entry.entry_id]["revalidate_channels"] = async_revalidate_channels
+        config_entry.async_create_background_task(hass, coordinator.async_refresh(), f"{DOMAIN} first monitoring poll")
+        config_entry.async_create_background_task(hass, alarms_coordinator.async_refresh(), f"{DOMAIN} first alarms poll")
+    else:
+        await coordinator.async_refresh()
+        await alarms_coordinator.async_refresh()
 
     entities = []
-    for device_data in data[0]:
-        if int(device_data["active"]) != 4:
-            deva4004_device_data = Deva4004DeviceData(hass, device_data, instance_name, ip_address)
-            entities.extend([
-                Deva4004ChannelSensor(coordinator, deva4004_device_data),
-                Deva4004ActiveSensor(coordinator, deva4004_device_data),
-                Deva4004AcqTimeSensor(coordinator, deva4004_device_data),
-                Deva4004FrequencySensor(coordinator, deva4004_device_data),
-                Deva4004RfLevelSensor(coordinator, deva4004_device_data),
-                Deva4004MpxLevelSensor(coordinator, deva4004_device_data),
-                Deva4004PilotLevelSensor(coordinator, deva4004_device_data),
-                Deva4004RdsLevelSensor(coordinator, deva4004_device_data),
-                Deva4004RightLevelSensor(coordinator, deva4004_device_data),
-                Deva4004LeftLevelSensor(coordinator, deva4004_device_data),
-                Deva4004RdsPiSensor(coordinator, deva4004_device_data),
-                Deva4004RdsPsSensor(coordinator, deva4004_device_data),
-                Deva4004RdsRtSensor(coordinator, deva4004_device_data),
-                Deva4004RfAlarmSensor(alarms_coordinator, deva4004_device_data),
-                Deva4004MpxAlarmSensor(alarms_coordinator, deva4004_device_data),
-                Deva4004PilotAlarmSensor(alarms_coordinator, deva4004_device_data),
-                Deva4004RdsAlarmSensor(alarms_coordinator, deva4004_device_data),
-            ])
-
-    async_add_entities(entities, True)
-
-
-class Deva4004DeviceData:
-    def __init__(self, hass, data, instance_name, ip_address):
-        self.hass = hass
-        self.data = data
+    for device_data in active_channels:
+        entities.extend(build_channel_entities(device_data))
+
+    if channels:
+        entities.extend(build_receiver_entities(channels[0]))
+
+    async_add_entities(entities, not cached)
+
+
+def _active_channels(channels):
+    return [device_data for device_data in channels if int(device_data["active"]) != 4]
+
+
+def _scan_channels(active_channels):
+    # The receiver visits the active channels in table order, each for its acq_time
+    return [
+        (str(device_data["frequency"]), int(device_data["acq_time"]))
+        for device_data in sorted(active_channels, key=lambda device_data: int(device_data["channel_number"]))
+    ]
+
+
+def _monitor_ttl(active_channels, data_update_interval):
+    # Every active channel is reported about once per scan cycle, or once per as many
+    # polls as there are channels when polls are the slower of the two
+    scan_cycle = max(
+        sum(int(device_data["acq_time"]) for device_data in active_channels),
+        len(active_channels) * data_update_interval,
+    )
+    return max(MONITOR_TTL_MIN, MONITOR_TTL_CYCLES * scan_cycle)
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Deva4004Channel:
+    # Built once per channel table row: the parsed numbers plus every name, ID and
+    # mapping the entities hand to Home Assistant, so a state write only reads slots
+    __slots__ = (
+        "instance_name", "ip_address", "name", "station_name", "channel_id", "channel_number",
+        "active", "antenna", "frequency", "frequency_key", "frequency_mhz", "acq_time",
+        "fw_version", "serial_number", "device_info", "alarm_attributes",
+    )
+
+    def __init__(self, data, instance_name, ip_address):
         self.instance_name = instance_name
         self.ip_address = ip_address
+        self.name = data["name"]
+        # SNMP returns station name like "103.0 KISS"; drop the frequency prefix
+        # so messages don't read "103.0 MHz - 103.0 KISS".
+        self.station_name = re.sub(r"^\d+(\.\d+)?\s+", "", self.name or "")
+        # The raw table value, as it appears in unique IDs and device identifiers
+        self.channel_id = data["channel_number"]
+        self.channel_number = _parse_int(data["channel_number"])
+        self.active = _parse_int(data["active"])
+        self.antenna = antenna_dict.get(self.active)
+        self.frequency = _parse_int(data["frequency"])
+        self.frequency_key = str(data["frequency"])
+        self.frequency_mhz = self.frequency / 1000 if self.frequency is not None else None
+        self.acq_time = _parse_int(data["acq_time"])
+        self.fw_version = data["fw_version"]
+        self.serial_number = data["serial_number"]
+        self.device_info = {
+            "identifiers": {(DOMAIN, f"{self.name}_{self.channel_id}")},
+            "name": self.name,
+            "manufacturer": "Deva Broadcast",
+            "model": "Deva4004",
+            "configuration_url": f"http://{ip_address}",
+            "sw_version": self.fw_version,
+            "hw_version": self.serial_number,
+        }
+        self.alarm_attributes = {
+            "location": (instance_name or "").replace("DEVA_", "").replace("_", " "),
+            "frequency_mhz": self.frequency_mhz,
+            "station_name": self.station_name,
+        }
+
+    def entity_name(self, label):
+        return f"{self.instance_name} {self.name} {label}"
+
+    def entity_unique_id(self, key):
+        return f"{self.instance_name}-{self.name}-{key}-{self.channel_id}"
 
 
 class Deva4004SensorBase(CoordinatorEntity, SensorEntity):
-    def __init__(self, coordinator: DataUpdateCoordinator, device_data: Deva4004DeviceData):
-        super().__init__(coordinator)
-        self.device_data = device_data
+    # Subclasses name themselves with entity_label; the unique ID key comes from
+    # entity_key, or the monitor/alarm key they read
+    entity_key = ""
+    entity_label = ""
+
+    def __init__(self, coordinator: DataUpdateCoordinator, channel: Deva4004Channel, context=None):
+        super().__init__(coordinator, context)
+        self.channel = channel
+        self._name = channel.entity_name(self.entity_label)
+        self._unique_id = channel.entity_unique_id(self.entity_key)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def unique_id(self):
+        return self._unique_id
 
     @property
     def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, str(self.device_data.data["name"]) + "_" + self.device_data.data['channel_number'])},
-            "name": self.device_data.data["name"],
-            "manufacturer": "Deva Broadcast",
-            "model": "Deva4004",
-            "configuration_url": f"http://{self.device_data.ip_address}",
-            "sw_version": self.device_data.data["fw_version"],
-            "hw_version": self.device_data.data["serial_number"],
-        }
+        return self.channel.device_info
 
 
 class Deva4004StaticSensor(Deva4004SensorBase):
-    # Value comes from the config-time device_data snapshot, not the coordinator
+    # Value comes from the config-time channel table, not the coordinator
+    def __init__(self, coordinator: DataUpdateCoordinator, channel: Deva4004Channel):
+        # No monitored field, so the change-aware coordinator never wakes it for a poll
+        super().__init__(coordinator, channel, (channel.frequency_key, None))
+
     @property
     def available(self):
         return True
@@ -140,11 +405,48 @@ class Deva4004StaticSensor(Deva4004SensorBase):
 
 class Deva4004FrequencyKeyedSensor(Deva4004SensorBase):
     # Value comes from coordinator.data keyed by the channel's frequency
+    monitor_key = ""
+
+    def __init__(self, coordinator: DataUpdateCoordinator, channel: Deva4004Channel):
+        # Only woken when this frequency's monitor_key changes
+        super().__init__(coordinator, channel, (channel.frequency_key, self.monitor_key))
+
+    @property
+    def entity_key(self):
+        return self.monitor_key
+
     @property
     def available(self):
         if not self.coordinator.last_update_success or self.coordinator.data is None:
             return False
-        return str(self.device_data.data["frequency"]) in self.coordinator.data
+        return self.channel.frequency_key in self.coordinator.data
+
+    @property
+    def state(self):
+        data = self.coordinator.data
+        record = data.get(self.channel.frequency_key) if data else None
+        return record.get(self.monitor_key) if record else None
+
+
+class Deva4004LevelSensor(Deva4004FrequencyKeyedSensor):
+    # Measured levels also carry the rolling statistics of their recent samples. They
+    # change on nearly every write, so keep them out of the recorder database. The
+    # aggregation window's min/max/mean are recorded: there is one set per window and
+    # they hold the peaks the published value may not show
+    _unrecorded_attributes = frozenset({"min", "max", "mean", "std_dev", "samples"})
+
+    @property
+    def extra_state_attributes(self):
+        attributes = None
+        history = self.coordinator.history
+        if history is not None:
+            attributes = history.stats(self.channel.frequency_key, self.monitor_key)
+        aggregator = self.coordinator.aggregator
+        if aggregator is not None:
+            window = aggregator.stats(self.channel.frequency_key, self.monitor_key)
+            if window is not None:
+                attributes = {**attributes, **window} if attributes else window
+        return attributes
 
 
 class Deva4004ChannelKeyedSensor(Deva4004SensorBase):
@@ -153,24 +455,16 @@ class Deva4004ChannelKeyedSensor(Deva4004SensorBase):
     def available(self):
         if not self.coordinator.last_update_success or self.coordinator.data is None:
             return False
-        try:
-            return int(self.device_data.data["channel_number"]) in self.coordinator.data
-        except (TypeError, ValueError):
-            return False
+        return self.channel.channel_number in self.coordinator.data
 
 
 class Deva4004ChannelSensor(Deva4004StaticSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} Channel"
+    entity_key = "channel"
+    entity_label = "Channel"
 
     @property
     def state(self):
-        return int(self.device_data.data["channel_number"]) + 1
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-channel-{self.device_data.data['channel_number']}"
+        return self.channel.channel_number + 1
 
     @property
     def icon(self):
@@ -178,17 +472,12 @@ class Deva4004ChannelSensor(Deva4004StaticSensor):
 
 
 class Deva4004ActiveSensor(Deva4004StaticSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} Active"
+    entity_key = "active"
+    entity_label = "Active"
 
     @property
     def state(self):
-        return antenna_dict.get(int(self.device_data.data["active"]))
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-active-{self.device_data.data['channel_number']}"
+        return self.channel.antenna
 
     @property
     def icon(self):
@@ -196,62 +485,41 @@ class Deva4004ActiveSensor(Deva4004StaticSensor):
 
 
 class Deva4004FrequencySensor(Deva4004StaticSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} Frequency"
+    entity_key = "frequency"
+    entity_label = "Frequency"
 
     @property
     def state(self):
-        return int(self.device_data.data["frequency"]) / 1000
+        return self.channel.frequency_mhz
 
     @property
     def unit_of_measurement(self):
         return "MHz"
 
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-frequency-{self.device_data.data['channel_number']}"
-
     @property
     def icon(self):
         return "mdi:radio-tower"
 
 
 class Deva4004AcqTimeSensor(Deva4004StaticSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} Acquisition Time"
+    entity_key = "acq_time"
+    entity_label = "Acquisition Time"
 
     @property
     def state(self):
-        return self.device_data.data["acq_time"]
+        return self.channel.acq_time
 
     @property
     def unit_of_measurement(self):
         return "s"
 
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-acq_time-{self.device_data.data['channel_number']}"
-
     @property
     def icon(self):
         return "mdi:clock-time-five-outline"
 
-
-class Deva4004RfLevelSensor(Deva4004FrequencyKeyedSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} RF Level"
-
-    @property
-    def state(self):
-        frequency = str(self.device_data.data["frequency"])
-        return self.coordinator.data.get(frequency, {}).get("rf_level") if self.coordinator.data else None
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-rf_level-{self.device_data.data['channel_number']}"
+class Deva4004RfLevelSensor(Deva4004LevelSensor):
+    monitor_key = "rf_level"
+    entity_label = "RF Level"
 
     @property
     def icon(self):
@@ -266,19 +534,9 @@ class Deva4004RfLevelSensor(Deva4004FrequencyKeyedSensor):
         return "measurement"
 
 
-class Deva4004MpxLevelSensor(Deva4004FrequencyKeyedSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} MPX Level"
-
-    @property
-    def state(self):
-        frequency = str(self.device_data.data["frequency"])
-        return self.coordinator.data.get(frequency, {}).get("mpx_level") if self.coordinator.data else None
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-mpx_level-{self.device_data.data['channel_number']}"
+class Deva4004MpxLevelSensor(Deva4004LevelSensor):
+    monitor_key = "mpx_level"
+    entity_label = "MPX Level"
 
     @property
     def icon(self):
@@ -293,19 +551,9 @@ class Deva4004MpxLevelSensor(Deva4004FrequencyKeyedSensor):
         return "measurement"
 
 
-class Deva4004PilotLevelSensor(Deva4004FrequencyKeyedSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} Pilot Level"
-
-    @property
-    def state(self):
-        frequency = str(self.device_data.data["frequency"])
-        return self.coordinator.data.get(frequency, {}).get("pilot_level") if self.coordinator.data else None
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-pilot_level-{self.device_data.data['channel_number']}"
+class Deva4004PilotLevelSensor(Deva4004LevelSensor):
+    monitor_key = "pilot_level"
+    entity_label = "Pilot Level"
 
     @property
     def icon(self):
@@ -320,19 +568,9 @@ class Deva4004PilotLevelSensor(Deva4004FrequencyKeyedSensor):
         return "measurement"
 
 
-class Deva4004RdsLevelSensor(Deva4004FrequencyKeyedSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} RDS Level"
-
-    @property
-    def state(self):
-        frequency = str(self.device_data.data["frequency"])
-        return self.coordinator.data.get(frequency, {}).get("rds_level") if self.coordinator.data else None
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-rds_level-{self.device_data.data['channel_number']}"
+class Deva4004RdsLevelSensor(Deva4004LevelSensor):
+    monitor_key = "rds_level"
+    entity_label = "RDS Level"
 
     @property
     def icon(self):
@@ -347,19 +585,9 @@ class Deva4004RdsLevelSensor(Deva4004FrequencyKeyedSensor):
         return "measurement"
 
 
-class Deva4004RightLevelSensor(Deva4004FrequencyKeyedSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} Right Level"
-
-    @property
-    def state(self):
-        frequency = str(self.device_data.data["frequency"])
-        return self.coordinator.data.get(frequency, {}).get("right_level") if self.coordinator.data else None
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-right_level-{self.device_data.data['channel_number']}"
+class Deva4004RightLevelSensor(Deva4004LevelSensor):
+    monitor_key = "right_level"
+    entity_label = "Right Level"
 
     @property
     def icon(self):
@@ -374,19 +602,9 @@ class Deva4004RightLevelSensor(Deva4004FrequencyKeyedSensor):
         return "measurement"
 
 
-class Deva4004LeftLevelSensor(Deva4004FrequencyKeyedSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} Left Level"
-
-    @property
-    def state(self):
-        frequency = str(self.device_data.data["frequency"])
-        return self.coordinator.data.get(frequency, {}).get("left_level") if self.coordinator.data else None
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-left_level-{self.device_data.data['channel_number']}"
+class Deva4004LeftLevelSensor(Deva4004LevelSensor):
+    monitor_key = "left_level"
+    entity_label = "Left Level"
 
     @property
     def icon(self):
@@ -402,18 +620,8 @@ class Deva4004LeftLevelSensor(Deva4004FrequencyKeyedSensor):
 
 
 class Deva4004RdsPiSensor(Deva4004FrequencyKeyedSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} RDS PI"
-
-    @property
-    def state(self):
-        frequency = str(self.device_data.data["frequency"])
-        return self.coordinator.data.get(frequency, {}).get("rds_pi") if self.coordinator.data else None
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-rds_pi-{self.device_data.data['channel_number']}"
+    monitor_key = "rds_pi"
+    entity_label = "RDS PI"
 
     @property
     def icon(self):
@@ -421,18 +629,8 @@ class Deva4004RdsPiSensor(Deva4004FrequencyKeyedSensor):
 
 
 class Deva4004RdsPsSensor(Deva4004FrequencyKeyedSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} RDS PS"
-
-    @property
-    def state(self):
-        frequency = str(self.device_data.data["frequency"])
-        return self.coordinator.data.get(frequency, {}).get("rds_ps") if self.coordinator.data else None
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-rds_ps-{self.device_data.data['channel_number']}"
+    monitor_key = "rds_ps"
+    entity_label = "RDS PS"
 
     @property
     def icon(self):
@@ -440,18 +638,8 @@ class Deva4004RdsPsSensor(Deva4004FrequencyKeyedSensor):
 
 
 class Deva4004RdsRtSensor(Deva4004FrequencyKeyedSensor):
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} RDS RT"
-
-    @property
-    def state(self):
-        frequency = str(self.device_data.data["frequency"])
-        return self.coordinator.data.get(frequency, {}).get("rds_rt") if self.coordinator.data else None
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-rds_rt-{self.device_data.data['channel_number']}"
+    monitor_key = "rds_rt"
+    entity_label = "RDS RT"
 
     @property
     def icon(self):
@@ -463,15 +651,20 @@ class Deva4004AlarmSensorBase(Deva4004ChannelKeyedSensor):
     alarm_type = ""
     level_kind = ""
 
+    def __init__(self, coordinator: DataUpdateCoordinator, channel: Deva4004Channel):
+        super().__init__(coordinator, channel)
+        self._attributes = None
+        self._attributes_entity_id = None
+
+    @property
+    def entity_key(self):
+        return self.alarm_key
+
     @property
     def state(self):
-        if self.coordinator.data is None:
-            return None
-        try:
-            channel_number = int(self.device_data.data["channel_number"])
-        except (TypeError, ValueError):
-            return None
-        value = self.coordinator.data.get(channel_number, {}).get(self.alarm_key)
+        data = self.coordinator.data
+        record = data.get(self.channel.channel_number) if data else None
+        value = record.get(self.alarm_key) if record else None
         if value is None:
             return None
         try:
@@ -485,82 +678,255 @@ class Deva4004AlarmSensorBase(Deva4004ChannelKeyedSensor):
 
     @property
     def extra_state_attributes(self):
-        instance = self.device_data.instance_name or ""
-        try:
-            freq_mhz = int(self.device_data.data["frequency"]) / 1000
-        except (TypeError, ValueError):
-            freq_mhz = None
-        # SNMP returns station name like "103.0 KISS"; drop the frequency prefix
-        # so messages don't read "103.0 MHz - 103.0 KISS".
-        station_name = self.device_data.data.get("name") or ""
-        station_name = re.sub(r"^\d+(\.\d+)?\s+", "", station_name)
-        level_entity_id = None
-        if self.entity_id and self.level_kind:
-            suffix = f"_{self.level_kind}_alarm"
-            replacement = f"_{self.level_kind}_level"
-            if self.entity_id.endswith(suffix):
-                level_entity_id = self.entity_id[: -len(suffix)] + replacement
-        return {
-            "location": instance.replace("DEVA_", "").replace("_", " "),
-            "frequency_mhz": freq_mhz,
-            "station_name": station_name,
-            "alarm_type": self.alarm_type,
-            "level_entity_id": level_entity_id,
-            "level_unit": "dBμV" if self.level_kind == "rf" else "kHz",
-        }
+        # Only level_entity_id depends on the entity, and only changes if the entity is renamed
+        if self._attributes is None or self._attributes_entity_id != self.entity_id:
+            level_entity_id = None
+            if self.entity_id and self.level_kind:
+                suffix = f"_{self.level_kind}_alarm"
+                replacement = f"_{self.level_kind}_level"
+                if self.entity_id.endswith(suffix):
+                    level_entity_id = self.entity_id[: -len(suffix)] + replacement
+            self._attributes = {
+                **self.channel.alarm_attributes,
+                "alarm_type": self.alarm_type,
+                "level_entity_id": level_entity_id,
+                "level_unit": "dBμV" if self.level_kind == "rf" else "kHz",
+            }
+            self._attributes_entity_id = self.entity_id
+        return self._attributes
 
 
 class Deva4004RfAlarmSensor(Deva4004AlarmSensorBase):
     alarm_key = "alarm_rf"
+    entity_label = "RF Alarm"
     alarm_type = "RF"
     level_kind = "rf"
 
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} RF Alarm"
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-alarm_rf-{self.device_data.data['channel_number']}"
-
 
 class Deva4004MpxAlarmSensor(Deva4004AlarmSensorBase):
     alarm_key = "alarm_mpx"
+    entity_label = "MPX Alarm"
     alarm_type = "MPX"
     level_kind = "mpx"
 
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} MPX Alarm"
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-alarm_mpx-{self.device_data.data['channel_number']}"
-
 
 class Deva4004PilotAlarmSensor(Deva4004AlarmSensorBase):
     alarm_key = "alarm_pilot"
+    entity_label = "Pilot Alarm"
     alarm_type = "Pilot"
     level_kind = "pilot"
 
-    @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} Pilot Alarm"
-
-    @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-alarm_pilot-{self.device_data.data['channel_number']}"
-
 
 class Deva4004RdsAlarmSensor(Deva4004AlarmSensorBase):
     alarm_key = "alarm_rds"
+    entity_label = "RDS Alarm"
     alarm_type = "RDS"
     level_kind = "rds"
 
+
+class Deva4004ReceiverSensorBase(Deva4004SensorBase):
+    # Diagnostics for the receiver as a whole, grouped on one device per receiver: its
+    # serial number, or the config entry when the receiver did not report one
+    def __init__(self, coordinator: DataUpdateCoordinator, channel: Deva4004Channel, receiver_id: str):
+        super().__init__(coordinator, channel)
+        self._name = f"{channel.instance_name} {self.entity_label}"
+        self._unique_id = f"{channel.instance_name}-{self.entity_key}-{receiver_id}"
+        self._device_info = {
+            "identifiers": {(DOMAIN, receiver_id)},
+            "name": channel.instance_name,
+            "manufacturer": "Deva Broadcast",
+            "model": "Deva4004",
+            "configuration_url": f"http://{channel.ip_address}",
+            "sw_version": channel.fw_version,
+            "hw_version": channel.serial_number,
+        }
+
     @property
-    def name(self):
-        return f"{self.device_data.instance_name} {self.device_data.data['name']} RDS Alarm"
+    def device_info(self):
+        return self._device_info
 
     @property
-    def unique_id(self):
-        return f"{self.device_data.instance_name}-{self.device_data.data['name']}-alarm_rds-{self.device_data.data['channel_number']}"
+    def entity_category(self):
+        return EntityCategory.DIAGNOSTIC
+
+
+class Deva4004ScanSensor(Deva4004ReceiverSensorBase):
+    # Receiver-wide view of how well scan-aware polling keeps up with the channel scan
+    entity_key = "scan"
+    entity_label = "Samples Per Scan Cycle"
+
+    @property
+    def state(self):
+        return self.coordinator.scheduler.samples_per_cycle
+
+    @property
+    def extra_state_attributes(self):
+        return self.coordinator.scheduler.stats()
+
+    @property
+    def icon(self):
+        return "mdi:radar"
+
+    @property
+    def state_class(self):
+        return "measurement"
+
+
+class Deva4004PollLagSensor(Deva4004ReceiverSensorBase):
+    # How far behind its slot in the fleet schedule the last monitoring poll started
+    entity_key = "poll_lag"
+    entity_label = "Poll Lag"
+
+    def __init__(self, coordinator: DataUpdateCoordinator, channel: Deva4004Channel, receiver_id: str, alarms_coordinator: DataUpdateCoordinator):
+        super().__init__(coordinator, channel, receiver_id)
+        self.alarms_coordinator = alarms_coordinator
+
+    @property
+    def available(self):
+        return True
+
+    @property
+    def state(self):
+        lag = self.coordinator.lag
+        return round(lag, 3) if lag is not None else None
+
+    @property
+    def extra_state_attributes(self):
+        alarms_lag = self.alarms_coordinator.lag
+        return {
+            "alarms_lag": round(alarms_lag, 3) if alarms_lag is not None else None,
+            "phase": round(self.coordinator.phase, 3),
+        }
+
+    @property
+    def unit_of_measurement(self):
+        return "s"
+
+    @property
+    def icon(self):
+        return "mdi:timer-sand"
+
+    @property
+    def state_class(self):
+        return "measurement"
+
+
+class Deva4004PollMetricSensor(Deva4004ReceiverSensorBase):
+    # One figure from the monitoring polls' SNMP instrumentation as the state, with the
+    # same figure for the alarm polls alongside
+    metric = None
+
+    @property
+    def available(self):
+        return self.coordinator.metrics.poll_stats(self.coordinator.name) is not None
+
+    @property
+    def state(self):
+        stats = self.coordinator.metrics.poll_stats(self.coordinator.name)
+        return stats[self.metric] if stats else None
+
+    @property
+    def extra_state_attributes(self):
+        stats = self.coordinator.metrics.poll_stats("alarms")
+        return {"alarms": stats[self.metric] if stats else None}
+
+    @property
+    def state_class(self):
+        return "measurement"
+
+
+class Deva4004PollLatencyP50Sensor(Deva4004PollMetricSensor):
+    entity_key = "poll_latency_p50"
+    entity_label = "Poll Latency P50"
+    metric = "p50"
+
+    @property
+    def unit_of_measurement(self):
+        return "ms"
+
+    @property
+    def icon(self):
+        return "mdi:timer-outline"
+
+
+class Deva4004PollLatencyP95Sensor(Deva4004PollLatencyP50Sensor):
+    entity_key = "poll_latency_p95"
+    entity_label = "Poll Latency P95"
+    metric = "p95"
+
+
+class Deva4004PollErrorRateSensor(Deva4004PollMetricSensor):
+    entity_key = "poll_error_rate"
+    entity_label = "Poll Error Rate"
+    metric = "error_rate"
+
+    @property
+    def unit_of_measurement(self):
+        return "%"
+
+    @property
+    def icon(self):
+        return "mdi:alert-circle-outline"
+
+
+class Deva4004PdusPerPollSensor(Deva4004PollMetricSensor):
+    entity_key = "pdus_per_poll"
+    entity_label = "PDUs Per Poll"
+    metric = "pdus"
+
+    @property
+    def icon(self):
+        return "mdi:swap-horizontal"
+
+
+class Deva4004BreakerSensor(Deva4004ReceiverSensorBase):
+    # Whether polls run (closed), are paused while the receiver is probed (open), or are
+    # on trial after a probe was answered (half_open)
+    entity_key = "breaker"
+    entity_label = "Polling Circuit"
+
+    @property
+    def available(self):
+        return True
+
+    @property
+    def state(self):
+        return self.coordinator.breaker.state
+
+    @property
+    def extra_state_attributes(self):
+        return self.coordinator.breaker.stats()
+
+    @property
+    def icon(self):
+        return "mdi:electric-switch-closed" if self.coordinator.breaker.state == BREAKER_CLOSED else "mdi:electric-switch"
+
+
+# Entities created for every active channel, per coordinator
+CHANNEL_SENSORS = (
+    Deva4004ChannelSensor,
+    Deva4004ActiveSensor,
+    Deva4004AcqTimeSensor,
+    Deva4004FrequencySensor,
+    Deva4004RfLevelSensor,
+    Deva4004MpxLevelSensor,
+    Deva4004PilotLevelSensor,
+    Deva4004RdsLevelSensor,
+    Deva4004RightLevelSensor,
+    Deva4004LeftLevelSensor,
+    Deva4004RdsPiSensor,
+    Deva4004RdsPsSensor,
+    Deva4004RdsRtSensor,
+)
+ALARM_SENSORS = (
+    Deva4004RfAlarmSensor,
+    Deva4004MpxAlarmSensor,
+    Deva4004PilotAlarmSensor,
+    Deva4004RdsAlarmSensor,
+)
+POLL_METRIC_SENSORS = (
+    Deva4004PollLatencyP50Sensor,
+    Deva4004PollLatencyP95Sensor,
+    Deva4004PollErrorRateSensor,
+    Deva4004PdusPerPollSensor,
+)
@@ -1,30 +1,151 @@
-from pysnmp.hlapi.v3arch.asyncio import get_cmd, bulk_walk_cmd, SnmpEngine, CommunityData, UdpTransportTarget, ContextData, ObjectType, ObjectIdentity
+from pysnmp.hlapi.v3arch.asyncio import get_cmd, bulk_cmd, bulk_walk_cmd, SnmpEngine, CommunityData, UsmUserData, UdpTransportTarget, ContextData, ObjectType, ObjectIdentity
+from pysnmp.hlapi.v3arch.asyncio import usmNoAuthProtocol, usmHMACMD5AuthProtocol, usmHMACSHAAuthProtocol, usmHMAC192SHA256AuthProtocol
+from pysnmp.hlapi.v3arch.asyncio import usmNoPrivProtocol, usmDESPrivProtocol, usmAesCfb128Protocol
+from pysnmp.proto import errind
+from pysnmp.proto.rfc1902 import Null
+from pysnmp.proto.rfc1905 import EndOfMibView, NoSuchInstance, NoSuchObject
 from .const import *
-import numpy as np
+from .metrics import Deva4004Metrics, poll_budget
+import asyncio
 import logging
+import time
 
 _LOGGER = logging.getLogger(__name__)
 
 def fr8p8_to_value(fr8p8_value):
-    return np.round(int(fr8p8_value) / 256, 1)
+    # FR8.8 fixed point to one decimal in integer arithmetic, rounding half to even
+    # like np.round did, and returning a plain float
+    tenths, remainder = divmod(int(fr8p8_value) * 10, 256)
+    if remainder > 128 or (remainder == 128 and tenths & 1):
+        tenths += 1
+    return tenths / 10
 
-async def _get_oid(engine: SnmpEngine, host: str, port: int, community: str, oid: str):
+def fr8p8_to_values(fr8p8_values):
+    return [fr8p8_to_value(fr8p8_value) for fr8p8_value in fr8p8_values]
+
+class _InFlight:
+    # Holds a slot in each limit for the duration of a request, always taken in the
+    # same order (device, then fleet) so no two requests can wait on each other
+    def __init__(self, *limits: asyncio.Semaphore):
+        self.limits = limits
+
+    async def __aenter__(self):
+        acquired = []
+        try:
+            for limit in self.limits:
+                await limit.acquire()
+                acquired.append(limit)
+        except BaseException:
+            for limit in reversed(acquired):
+                limit.release()
+            raise
+
+    async def __aexit__(self, *exc_info):
+        for limit in reversed(self.limits):
+            limit.release()
+
+V3_AUTH_PROTOCOL_OIDS = {
+    "none": usmNoAuthProtocol,
+    "md5": usmHMACMD5AuthProtocol,
+    "sha": usmHMACSHAAuthProtocol,
+    "sha256": usmHMAC192SHA256AuthProtocol,
+}
+V3_PRIV_PROTOCOL_OIDS = {
+    "none": usmNoPrivProtocol,
+    "des": usmDESPrivProtocol,
+    "aes": usmAesCfb128Protocol,
+}
+
+def _auth_data(version: str, community: str, usm=None):
+    if version == SNMP_VERSION_3:
+        auth_protocol = usm.get(CONF_V3_AUTH_PROTOCOL, DEFAULT_V3_AUTH_PROTOCOL)
+        priv_protocol = usm.get(CONF_V3_PRIV_PROTOCOL, DEFAULT_V3_PRIV_PROTOCOL) if auth_protocol != "none" else "none"
+        return UsmUserData(
+            usm[CONF_V3_USERNAME],
+            usm.get(CONF_V3_AUTH_KEY) if auth_protocol != "none" else None,
+            usm.get(CONF_V3_PRIV_KEY) if priv_protocol != "none" else None,
+            authProtocol=V3_AUTH_PROTOCOL_OIDS[auth_protocol],
+            privProtocol=V3_PRIV_PROTOCOL_OIDS[priv_protocol],
+        )
+    return CommunityData(community, mpModel=0 if version == SNMP_VERSION_1 else 1)
+
+class Deva4004Session:
+    # One per device: resolves the address and builds the transport target once,
+    # then hands the same objects to every get/walk for the lifetime of the entry.
+    # `usm` carries the SNMPv3 user settings (the entry data) when version is 3
+    def __init__(self, engine: SnmpEngine, host: str, port: int, community: str, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, fleet_in_flight: asyncio.Semaphore | None = None, version: str = DEFAULT_SNMP_VERSION, usm=None):
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.community = community
+        self.version = version
+        self.auth_data = _auth_data(version, community, usm)
+        self.max_var_binds = SNMP_MAX_VAR_BINDS[version]
+        self.context = ContextData()
+        self.transports_created = 0
+        self.transports_reused = 0
+        self.metrics = Deva4004Metrics()
+        # Caps how many gets/walks run against the device at the same time, and
+        # across all devices when the session belongs to the fleet poller
+        limits = (asyncio.Semaphore(max_in_flight),)
+        if fleet_in_flight is not None:
+            limits += (fleet_in_flight,)
+        self.in_flight = _InFlight(*limits)
+        # The scalars of a targeted monitoring GET, less any the agent turned out not to serve
+        self.monitor_oids = list(MONITOR_OIDS)
+        self._targets = {}
+
+    def timing(self):
+        # (timeout, retries) for the next request: the timeout follows the device's RTT,
+        # and the retries fill what the current poll may wait, so a lost packet or a dead
+        # device costs at most that much of the poll interval
+        budget = poll_budget()
+        timeout = min(self.metrics.rtt.timeout, budget)
+        retries = max(0, min(SNMP_MAX_RETRIES, int(budget / timeout) - 1))
+        return timeout, retries
+
+    async def transport(self, timeout: float = 1.0, retries: int = 5):
+        key = (timeout, retries)
+        target = self._targets.get(key)
+        if target is not None:
+            self.transports_reused += 1
+            return target
+
+        target = await UdpTransportTarget.create((self.host, self.port), timeout=timeout, retries=retries)
+        # Another request may have created the same target while we were resolving
+        if key in self._targets:
+            self.transports_reused += 1
+            return self._targets[key]
+
+        self._targets[key] = target
+        self.transports_created += 1
+        _LOGGER.debug("Created SNMP transport for %s:%s (timeout=%s, retries=%s)", self.host, self.port, timeout, retries)
+        return target
+
+async def _get_oid(session: Deva4004Session, oid: str):
     error = None
     result = None
+    timed_out = False
+    operation = None
 
     try:
-        error_indication, error_status, error_index, var_binds = await get_cmd(
-            engine,
-            CommunityData(community, mpModel=0),
-            await UdpTransportTarget.create((host, port)),
-            ContextData(),
-            ObjectType(ObjectIdentity(oid)),
-            lookupMib=False,
-        )
+        async with session.in_flight:
+            timeout, retries = session.timing()
+            operation = session.metrics.start("get", timeout, retries)
+            error_indication, error_status, error_index, var_binds = await get_cmd(
+                session.engine,
+                session.auth_data,
+                await session.transport(timeout=timeout, retries=retries),
+                session.context,
+                ObjectType(ObjectIdentity(oid)),
+                lookupMib=False,
+            )
+            operation.response(var_binds)
 
         if error_indication:
             _LOGGER.error("SNMP connection error: %s", error_indication)
             error = str(error_indication)
+            timed_out = isinstance(error_indication, errind.RequestTimedOut)
         elif error_status:
             _LOGGER.error("SNMP error: %s", error_status.prettyPrint())
             error = str(error_status.prettyPrint())
@@ -35,165 +156,368 @@ async def _get_oid(engine: SnmpEngine, host: str, port: int, community: str, oid
         _LOGGER.error("Exception in SNMP connection: %s", e)
         error = str(e)
 
+    finally:
+        if operation is not None:
+            session.metrics.finish(operation, error, timed_out)
+
     return result, error
 
-async def _get_snmp_subtree(engine: SnmpEngine, host: str, port: int, community: str, base_oid: str):
-    subtree = []
+async def _probe(session: Deva4004Session) -> bool:
+    # A single-attempt GET of the firmware version, to see whether an unreachable
+    # receiver is back; failures are expected here, so they are not logged as errors
     error = None
+    timed_out = False
+    async with session.in_flight:
+        timeout = session.metrics.rtt.timeout
+        operation = session.metrics.start("probe", timeout, 0)
+        try:
+            error_indication, error_status, error_index, var_binds = await get_cmd(
+                session.engine,
+                session.auth_data,
+                await session.transport(timeout=timeout, retries=0),
+                session.context,
+                ObjectType(ObjectIdentity(OID_FW_VERSION)),
+                lookupMib=False,
+            )
+            operation.response(var_binds)
+            error = error_indication or error_status
+            timed_out = isinstance(error_indication, errind.RequestTimedOut)
+        except Exception as e:
+            error = e
+        finally:
+            session.metrics.finish(operation, error, timed_out)
+    if error:
+        _LOGGER.debug("Probe of %s failed: %s", session.host, error)
+    return not error
 
-    try:
-        async for (error_indication,
-                   error_status,
-                   error_index,
-                   var_binds) in bulk_walk_cmd(
-                       engine,
-                       CommunityData(community, mpModel=0),
-                       await UdpTransportTarget.create((host, port), timeout=10.0, retries=1),
-                       ContextData(),
-                       0, 50,
-                       ObjectType(ObjectIdentity(base_oid)),
-                       lookupMib=False,
-                       lexicographicMode=False,
-                   ):
+async def _get_identity(session: Deva4004Session, timeout: float = CONFIG_PROBE_TIMEOUT, retries: int = CONFIG_PROBE_RETRIES):
+    # Firmware version and serial number in one GET: enough to tell that a DEVA4004
+    # answers at this address with these credentials, and which one it is
+    result = None
+    error = None
+    timed_out = False
+    async with session.in_flight:
+        operation = session.metrics.start("identity", timeout, retries)
+        try:
+            error_indication, error_status, error_index, var_binds = await get_cmd(
+                session.engine,
+                session.auth_data,
+                await session.transport(timeout=timeout, retries=retries),
+                session.context,
+                ObjectType(ObjectIdentity(OID_FW_VERSION)),
+                ObjectType(ObjectIdentity(OID_SERIAL_VERSION)),
+                lookupMib=False,
+            )
+            operation.response(var_binds)
             if error_indication:
-                _LOGGER.error("SNMP connection error: %s", error_indication)
                 error = str(error_indication)
-                raise Exception(error)
+                timed_out = isinstance(error_indication, errind.RequestTimedOut)
             elif error_status:
-                _LOGGER.error(
-                    "SNMP error: %s at %s",
-                    error_status.prettyPrint(),
-                    var_binds[int(error_index) - 1] if error_index else "?",
-                )
-                error = str(error_status)
-                raise Exception(error)
+                error = str(error_status.prettyPrint())
+            elif len(var_binds) != 2 or any(isinstance(value, (NoSuchObject, NoSuchInstance)) for _, value in var_binds):
+                error = "Not a DEVA4004 receiver"
             else:
-                for var_bind in var_binds:
-                    oid, value = [x.prettyPrint() for x in var_bind]
-                    subtree.append(value)
+                result = tuple(value.prettyPrint() for _, value in var_binds)
+        except Exception as e:
+            error = str(e)
+        finally:
+            session.metrics.finish(operation, error, timed_out)
+    if error:
+        _LOGGER.debug("Identity GET to %s failed: %s", session.host, error)
+    return result, error
+
+async def _discover_receivers(engine: SnmpEngine, hosts, port: int, community: str, max_in_flight: int = DISCOVERY_MAX_IN_FLIGHT):
+    # Identity GET to every host at once, at most max_in_flight in flight. SNMPv1 first,
+    # which v2c agents answer as well; a receiver that answered is asked again over v2c
+    # to choose the version its entry polls with. Returns {serial number: (host,
+    # version, firmware version)}, keeping the first host of a receiver seen twice
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def probe(host):
+        identity, _ = await _get_identity(
+            Deva4004Session(engine, host, port, community, fleet_in_flight=in_flight, version=SNMP_VERSION_1),
+            DISCOVERY_TIMEOUT, DISCOVERY_RETRIES,
+        )
+        if identity is None:
+            return None
+        v2c, _ = await _get_identity(
+            Deva4004Session(engine, host, port, community, fleet_in_flight=in_flight, version=SNMP_VERSION_2C),
+            DISCOVERY_TIMEOUT, 0,
+        )
+        return host, SNMP_VERSION_2C if v2c else SNMP_VERSION_1, identity
+
+    start = time.monotonic()
+    found = {}
+    for result in await asyncio.gather(*(probe(host) for host in hosts)):
+        if result is not None:
+            host, version, (fw_version, serial_number) = result
+            found.setdefault(serial_number, (host, version, fw_version))
+    _LOGGER.debug("Probed %d hosts in %.1f s, found %d receivers", len(hosts), time.monotonic() - start, len(found))
+    return found
+
+async def _get_snmp_table(session: Deva4004Session, base_oids):
+    # Walk several columns of the same table in lockstep: every GETBULK carries one
+    # cursor per column, so N columns cost about as many PDUs as a single walk
+    bases = [tuple(int(x) for x in oid.strip(".").split(".")) for oid in base_oids]
+    columns = [[] for _ in bases]
+    cursors = dict(enumerate(base_oids))
+    last_oids = dict(enumerate(bases))
+    error = None
+    timed_out = False
+    operation = None
+
+    try:
+        async with session.in_flight:
+            timeout, retries = session.timing()
+            operation = session.metrics.start("table", timeout, retries)
+            transport = await session.transport(timeout=timeout, retries=retries)
+            while cursors:
+                active = list(cursors)
+                error_indication, error_status, error_index, var_binds = await bulk_cmd(
+                    session.engine,
+                    session.auth_data,
+                    transport,
+                    session.context,
+                    0, max(1, session.max_var_binds // len(active)),
+                    *[ObjectType(ObjectIdentity(cursors[column]), Null("")) for column in active],
+                    lookupMib=False,
+                )
+                operation.response(var_binds)
+                if error_indication:
+                    _LOGGER.error("SNMP connection error: %s", error_indication)
+                    error = str(error_indication)
+                    timed_out = isinstance(error_indication, errind.RequestTimedOut)
+                    raise Exception(error)
+                elif error_status == 2 and error_index:
+                    # SNMPv1 reports the end of the MIB as noSuchName on the column that ran out
+                    cursors.pop(active[int(error_index) - 1])
+                    continue
+                elif error_status:
+                    _LOGGER.error(
+                        "SNMP error: %s at %s",
+                        error_status.prettyPrint(),
+                        var_binds[int(error_index) - 1] if error_index else "?",
+                    )
+                    error = str(error_status)
+                    raise Exception(error)
+                elif not var_binds:
+                    break
+
+                # Responses come back row by row, one var-bind per requested column
+                for position, (name, value) in enumerate(var_binds):
+                    column = active[position % len(active)]
+                    if column not in cursors:
+                        continue
+                    base = bases[column]
+                    oid = tuple(name)
+                    if isinstance(value, EndOfMibView) or oid[:len(base)] != base:
+                        del cursors[column]
+                        continue
+                    if oid <= last_oids[column]:
+                        # An agent that does not move forward would keep this walk going forever
+                        _LOGGER.warning("SNMP agent %s returned a non-increasing OID %s, stopping the walk of that column", session.host, name)
+                        del cursors[column]
+                        continue
+                    columns[column].append(value.prettyPrint())
+                    cursors[column] = name
+                    last_oids[column] = oid
 
     except Exception as e:
         _LOGGER.error("SNMP connection error: %s", e)
         error = str(e)
         raise
 
-    return subtree, error
+    finally:
+        if operation is not None:
+            session.metrics.finish(operation, error, timed_out)
 
+    return columns, error
 
+async def _timed(label: str, awaitable):
+    start = time.monotonic()
+    try:
+        return await awaitable
+    finally:
+        _LOGGER.debug("%s took %.3f s", label, time.monotonic() - start)
 
-async def _get_logger_data(engine: SnmpEngine, host: str, port: int, community: str):
-    data_and_errors = [
-        await _get_snmp_subtree(engine, host, port, community, BASE_OID_NAME),
-        await _get_snmp_subtree(engine, host, port, community, BASE_OID_ACTIVE_INACTIVE),
-        await _get_snmp_subtree(engine, host, port, community, BASE_OID_FREQUENCY_MHZ),
-        await _get_snmp_subtree(engine, host, port, community, BASE_OID_CHANNEL_NUMBER),
-        await _get_snmp_subtree(engine, host, port, community, BASE_OID_ACQ_TIME),
-    ]
-
-    fw_version, fw_version_error = await _get_oid(engine, host, port, community, OID_FW_VERSION)
-    serial_number, serial_number_error = await _get_oid(engine, host, port, community, OID_SERIAL_VERSION)
-
-    # Duplicate the fw_version to match the length of other data arrays
-    fw_version_array = (fw_version,) * len(data_and_errors[0][0])
-    serial_number_array = (serial_number,) * len(data_and_errors[0][0])
-
-    data_and_errors.append((fw_version_array, fw_version_error))
-    data_and_errors.append((serial_number_array, serial_number_error))
+async def _get_logger_data(session: Deva4004Session):
+    # The table walk and the two scalar gets are independent; session.in_flight bounds how many hit the device at once
+    start = time.monotonic()
+    (table, table_error), (fw_version, fw_version_error), (serial_number, serial_number_error) = await asyncio.gather(
+        _timed("channel table walk", _get_snmp_table(session, LOGGER_TABLE_COLUMNS)),
+        _timed("fw version get", _get_oid(session, OID_FW_VERSION)),
+        _timed("serial number get", _get_oid(session, OID_SERIAL_VERSION)),
+    )
+    _LOGGER.debug("Logger data from %s fetched in %.3f s", session.host, time.monotonic() - start)
 
-    subtree_lengths = [len(d) for d, _ in data_and_errors[:5]]
+    subtree_lengths = [len(column) for column in table]
     if len(set(subtree_lengths)) > 1:
         _LOGGER.warning(
             "SNMP subtree length mismatch (name/active/freq/channel/acq_time): %s — channels will be truncated to the shortest",
             subtree_lengths,
         )
 
-    data = zip(*[d for d, _ in data_and_errors])
-    errors = [e for _, e in data_and_errors if e is not None]
+    errors = [e for e in (table_error, fw_version_error, serial_number_error) if e is not None]
+    return _channel_rows(table, fw_version, serial_number), errors
 
+def _channel_rows(table, fw_version, serial_number):
+    # Column lists of the logger table walk -> one dict per channel
     return [
-        dict(zip(("name", "active", "frequency", "channel_number", "acq_time", "fw_version", "serial_number"), values))
-        for values in data
-    ], errors
+        dict(zip(LOGGER_TABLE_FIELDS, values), fw_version=fw_version, serial_number=serial_number)
+        for values in zip(*table)
+    ]
+
+def _oid_tuple(oid: str):
+    return tuple(int(x) for x in oid.strip(".").split("."))
+
+def _decode_text(value):
+    return str(value)
+
+MONITOR_FREQUENCY_OID = _oid_tuple(OID_FREQ_MONITOR)
 
-async def _get_monitor_data(engine: SnmpEngine, host, port, community, base_oid, freq_data):
-    _LOGGER.debug(f"Starting monitor data poll. Currently tracking {len(freq_data)} frequencies: {list(freq_data.keys())}")
+# Parsed OID -> (field, decoder) for every monitoring scalar that lands in freq_data.
+# A new metric only needs a row here (and its OID in MONITOR_OIDS for targeted mode).
+# Fixed-point levels are collected and decoded together by fr8p8_to_values.
+MONITOR_DECODERS = {
+    _oid_tuple(OID_RF_LEVEL): ("rf_level", fr8p8_to_values),
+    _oid_tuple(OID_MPX_LEVEL): ("mpx_level", fr8p8_to_values),
+    _oid_tuple(OID_LEFT_LEVEL): ("left_level", fr8p8_to_values),
+    _oid_tuple(OID_RIGHT_LEVEL): ("right_level", fr8p8_to_values),
+    _oid_tuple(OID_PILOT_LEVEL): ("pilot_level", fr8p8_to_values),
+    _oid_tuple(OID_RDS_LEVEL): ("rds_level", fr8p8_to_values),
+    _oid_tuple(OID_RDS_PI): ("rds_pi", _decode_text),
+    _oid_tuple(OID_RDS_PS): ("rds_ps", _decode_text),
+    _oid_tuple(OID_RDS_RT): ("rds_rt", _decode_text),
+}
 
+MONITOR_FIELDS = tuple(field for field, _ in MONITOR_DECODERS.values())
+MONITOR_LEVEL_FIELDS = tuple(field for field, decode in MONITOR_DECODERS.values() if decode is fr8p8_to_values)
+
+def _decode_monitor_var_binds(var_binds):
+    # Values are only attributed once the frequency OID has been seen, as the device
+    # reports the levels of whatever frequency it is currently tuned to
     frequency = None
-    updated_frequency = None
-    async for errorIndication, errorStatus, errorIndex, varBinds in bulk_walk_cmd(
-        engine,
-        CommunityData(community, mpModel=0),
-        await UdpTransportTarget.create((host, port)),
-        ContextData(),
-        0, 5,
-        ObjectType(ObjectIdentity(base_oid)),
-        lookupMib=False,
-        lexicographicMode=False
-    ):
+    values = {}
+    level_fields = []
+    level_values = []
+    for name, value in var_binds:
+        oid = name.asTuple()
+        # v2c/v3 agents answer a missing column with an exception value: leave that field out
+        if isinstance(value, (NoSuchObject, NoSuchInstance, EndOfMibView)):
+            continue
+        if oid == MONITOR_FREQUENCY_OID:
+            frequency = str(value)
+        elif frequency:
+            decoder = MONITOR_DECODERS.get(oid)
+            if decoder is None:
+                continue
+            field, decode = decoder
+            if decode is fr8p8_to_values:
+                level_fields.append(field)
+                level_values.append(int(value))
+            else:
+                values[field] = decode(value)
+    values.update(zip(level_fields, fr8p8_to_values(level_values)))
+    return frequency, values
+
+async def _get_monitor_targeted(session: Deva4004Session, operation, transport):
+    # One GET carrying exactly the scalars we decode; OID_FREQ_MONITOR goes first so the
+    # levels that follow are attributed to the frequency in this response. SNMPv1 fails
+    # the whole GET with noSuchName on one OID the agent lacks: that OID is dropped for
+    # the life of the session and the GET sent again. Returns None once the frequency
+    # itself is unsupported, as the scalars mean nothing without it
+    while session.monitor_oids:
+        response = await get_cmd(
+            session.engine,
+            session.auth_data,
+            transport,
+            session.context,
+            *[ObjectType(ObjectIdentity(oid)) for oid in session.monitor_oids],
+            lookupMib=False,
+        )
+        error_indication, error_status, error_index, var_binds = response
+        if error_indication or error_status != 2 or not error_index:
+            return response
+        operation.response(var_binds)
+        unsupported = session.monitor_oids.pop(int(error_index) - 1)
+        if unsupported == OID_FREQ_MONITOR:
+            session.monitor_oids.clear()
+        _LOGGER.warning("%s does not serve %s, no longer asking for it", session.host, unsupported)
+    return None
+
+async def _get_monitor_sample(session: Deva4004Session, base_oid, monitor_mode=MONITOR_MODE_TARGETED):
+    async with session.in_flight:
+        timeout, retries = session.timing()
+        operation = session.metrics.start(f"monitor_{monitor_mode}", timeout, retries)
+        try:
+            transport = await session.transport(timeout=timeout, retries=retries)
+            response = None
+            if monitor_mode != MONITOR_MODE_WALK:
+                response = await _get_monitor_targeted(session, operation, transport)
+            if response is not None:
+                responses = [response]
+            else:
+                # Walk mode, or the targeted GET fell back to it
+                responses = []
+                async for response in bulk_walk_cmd(
+                    session.engine,
+                    session.auth_data,
+                    transport,
+                    session.context,
+                    0, session.max_var_binds,
+                    ObjectType(ObjectIdentity(base_oid)),
+                    lookupMib=False,
+                    lexicographicMode=False
+                ):
+                    responses.append(response)
+                    if response[0]:
+                        # pysnmp keeps walking after a timeout, resending the same request forever
+                        break
+        except Exception as e:
+            session.metrics.finish(operation, e)
+            raise
+
+    var_binds = []
+    error = None
+    timed_out = False
+    for errorIndication, errorStatus, errorIndex, varBinds in responses:
+        operation.response(varBinds)
         if errorIndication:  # SNMP engine errors
             _LOGGER.error(f"SNMP error indication: {errorIndication}")
+            error = errorIndication
+            timed_out = isinstance(errorIndication, errind.RequestTimedOut)
             continue
         elif errorStatus:  # SNMP agent errors
             _LOGGER.error('%s at %s' % (errorStatus.prettyPrint(), varBinds[int(errorIndex) - 1] if errorIndex else '?'))
+            error = errorStatus.prettyPrint()
             continue
-        else:
-            for varBind in varBinds:  # SNMP response contents
-                oid, value = [x.prettyPrint() for x in varBind]
-                if oid == OID_FREQ_MONITOR:  # if this is the frequency OID
-                    frequency = value
-                    updated_frequency = frequency
-                    if frequency not in freq_data:  # if this frequency is not already a key in the dictionary
-                        freq_data[frequency] = {}
-                        _LOGGER.info(f"New frequency detected: {frequency}")
-                elif oid == OID_RF_LEVEL:
-                    if frequency:
-                        freq_data[frequency]['rf_level'] = fr8p8_to_value(value)
-                elif oid == OID_MPX_LEVEL:
-                    if frequency:
-                        freq_data[frequency]['mpx_level'] = fr8p8_to_value(value)
-                elif oid == OID_LEFT_LEVEL:
-                    if frequency:
-                        freq_data[frequency]['left_level'] = fr8p8_to_value(value)
-                elif oid == OID_RIGHT_LEVEL:
-                    if frequency:
-                        freq_data[frequency]['right_level'] = fr8p8_to_value(value)
-                elif oid == OID_PILOT_LEVEL:
-                    if frequency:
-                        freq_data[frequency]['pilot_level'] = fr8p8_to_value(value)
-                elif oid == OID_RDS_LEVEL:
-                    if frequency:
-                        freq_data[frequency]['rds_level'] = fr8p8_to_value(value)
-                elif oid == OID_RDS_PI:
-                    if frequency:
-                        freq_data[frequency]['rds_pi'] = str(value)
-                elif oid == OID_RDS_PS:
-                    if frequency:
-                        freq_data[frequency]['rds_ps'] = str(value)
-                elif oid == OID_RDS_RT:
-                    if frequency:
-                        freq_data[frequency]['rds_rt'] = str(value)
-
-    if updated_frequency:
-        _LOGGER.debug(f"Updated freq {updated_frequency}, data: {freq_data[updated_frequency]}")
-    else:
-        _LOGGER.debug("No frequency data received in this poll")
-
-    _LOGGER.debug(f"Poll complete. Total frequencies: {len(freq_data)}, keys: {list(freq_data.keys())}")
-    return freq_data
-
-async def _get_alarms_data(engine: SnmpEngine, host: str, port: int, community: str):
-    alarm_rf, _ = await _get_snmp_subtree(engine, host, port, community, BASE_OID_ALARM_RF)
-    alarm_mpx, _ = await _get_snmp_subtree(engine, host, port, community, BASE_OID_ALARM_MPX)
-    alarm_pilot, _ = await _get_snmp_subtree(engine, host, port, community, BASE_OID_ALARM_PILOT)
-    alarm_rds, _ = await _get_snmp_subtree(engine, host, port, community, BASE_OID_ALARM_RDS)
-
-    count = min(len(alarm_rf), len(alarm_mpx), len(alarm_pilot), len(alarm_rds))
+        var_binds.extend(varBinds)
+    session.metrics.finish(operation, error, timed_out)
+
+    # A walk spreads the scalars over several responses, so decode them as one sequence
+    return _decode_monitor_var_binds(var_binds)
+
+# Alarm table column -> field name, in ALARM_TABLE_COLUMNS order
+ALARM_FIELDS = ("alarm_rf", "alarm_mpx", "alarm_pilot", "alarm_rds")
+ALARM_COLUMN_FIELDS = {_oid_tuple(column): field for column, field in zip(ALARM_TABLE_COLUMNS, ALARM_FIELDS)}
+
+async def _get_alarms_data(session: Deva4004Session):
+    columns, _ = await _get_snmp_table(session, ALARM_TABLE_COLUMNS)
+
+    count = min(len(column) for column in columns)
     return {
-        i: {
-            "alarm_rf": alarm_rf[i],
-            "alarm_mpx": alarm_mpx[i],
-            "alarm_pilot": alarm_pilot[i],
-            "alarm_rds": alarm_rds[i],
-        }
+        i: dict(zip(ALARM_FIELDS, (column[i] for column in columns)))
         for i in range(count)
-    }
\ No newline at end of file
+    }
+
+def _decode_alarm_var_binds(var_binds):
+    # Alarm table instances (e.g. from a trap) -> {channel index: {field: value}}, keyed like
+    # _get_alarms_data: table rows are numbered from 1, polled data is indexed from 0
+    alarms = {}
+    for name, value in var_binds:
+        oid = tuple(name)
+        field = ALARM_COLUMN_FIELDS.get(oid[:-1])
+        if field is None or oid[-1] < 1:
+            continue
+        alarms.setdefault(oid[-1] - 1, {})[field] = value.prettyPrint()
+    return alarms
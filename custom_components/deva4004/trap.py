@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import socket
+from pyasn1.codec.ber import decoder, encoder
+from pysnmp.proto import api
+from homeassistant.core import HomeAssistant, callback
+from .const import *
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _decode_notification(payload: bytes):
+    # SNMPv1 trap, SNMPv2c trap or inform -> (community, var_binds, response to send back or None)
+    version = int(api.decodeMessageVersion(payload))
+    module = api.PROTOCOL_MODULES.get(version)
+    if module is None:
+        return None, None, None
+    message, _ = decoder.decode(payload, asn1Spec=module.Message())
+    community = bytes(module.apiMessage.get_community(message))
+    pdu = module.apiMessage.get_pdu(message)
+
+    if version == api.SNMP_VERSION_1 and pdu.isSameTypeWith(module.TrapPDU()):
+        return community, module.apiTrapPDU.get_varbinds(pdu), None
+    if version == api.SNMP_VERSION_2C:
+        if pdu.isSameTypeWith(module.SNMPv2TrapPDU()):
+            return community, module.apiPDU.get_varbinds(pdu), None
+        if pdu.isSameTypeWith(module.InformRequestPDU()):
+            # Informs are retried by the sender until acknowledged
+            response = module.apiMessage.get_response(message)
+            module.apiPDU.set_varbinds(module.apiMessage.get_pdu(response), module.apiPDU.get_varbinds(pdu))
+            return community, module.apiPDU.get_varbinds(pdu), encoder.encode(response)
+    return community, None, None
+
+
+class Deva4004TrapListener(asyncio.DatagramProtocol):
+    # One UDP socket per trap port, shared by every entry; notifications are routed
+    # to the entry whose device address they came from, if they carry its community
+    def __init__(self, port: int):
+        self.port = port
+        self.handlers = {}
+        self.transport = None
+        self.bound = None
+        self.received = 0
+        self.ignored = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        registered = self.handlers.get(addr[0])
+        if registered is None:
+            self.ignored += 1
+            _LOGGER.debug("Ignoring SNMP notification from unknown host %s", addr[0])
+            return
+        community, handler = registered
+        try:
+            received_community, var_binds, response = _decode_notification(data)
+        except Exception as e:
+            self.ignored += 1
+            _LOGGER.debug("Dropping undecodable SNMP notification from %s: %s", addr[0], e)
+            return
+        # The source address alone is trivial to spoof
+        if received_community != community:
+            self.ignored += 1
+            _LOGGER.debug("Dropping SNMP notification from %s with the wrong community", addr[0])
+            return
+        if var_binds is None:
+            self.ignored += 1
+            return
+        if response is not None:
+            self.transport.sendto(response, addr)
+        handler(var_binds)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+
+async def async_register_trap_handler(hass: HomeAssistant, port: int, host: str, community: str, handler):
+    # Returns a callback that removes the handler, closing the socket with the last one
+    # Traps come from the device's IP address, while the entry may hold a host name
+    infos = await hass.loop.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    addresses = {info[4][0] for info in infos}
+
+    listeners = hass.data.setdefault(DOMAIN, {}).setdefault("trap_listeners", {})
+    while True:
+        listener = listeners.get(port)
+        if listener is not None:
+            # Another entry is binding this port: share its socket, or bind again if it failed
+            if await asyncio.shield(listener.bound):
+                break
+            continue
+        # Claim the port before binding so entries set up concurrently share the socket
+        listener = listeners[port] = Deva4004TrapListener(port)
+        listener.bound = hass.loop.create_future()
+        try:
+            await hass.loop.create_datagram_endpoint(lambda: listener, local_addr=("0.0.0.0", port))
+        except BaseException:
+            # Also on cancellation, so the next entry does not find a listener without a socket
+            if listeners.get(port) is listener:
+                del listeners[port]
+            listener.bound.set_result(False)
+            raise
+        listener.bound.set_result(True)
+        _LOGGER.info("Listening for SNMP traps on UDP port %s", port)
+        break
+
+    registered = (community.encode(), handler)
+    for address in addresses:
+        listener.handlers[address] = registered
+
+    @callback
+    def unregister():
+        for address in addresses:
+            if listener.handlers.get(address) is registered:
+                del listener.handlers[address]
+        if not listener.handlers:
+            listener.close()
+            listeners.pop(port, None)
+
+    return unregister
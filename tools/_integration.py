@@ -0,0 +1,20 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+INTEGRATION_DIR = Path(__file__).resolve().parent.parent / "custom_components" / "deva4004"
+PACKAGE = "custom_components.deva4004"
+
+
+def load(module: str):
+    # Import an integration submodule without running the package __init__, so the
+    # SNMP-side tools only need pysnmp and not a full Home Assistant install
+    if PACKAGE not in sys.modules:
+        namespace = types.ModuleType("custom_components")
+        namespace.__path__ = [str(INTEGRATION_DIR.parent)]
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [str(INTEGRATION_DIR)]
+        sys.modules.setdefault("custom_components", namespace)
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{module}")
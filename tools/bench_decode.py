@@ -0,0 +1,108 @@
+"""Micro-benchmark for decoding one monitoring poll.
+
+Compares the old prettyPrint + if/elif chain and np.round conversion with the table-driven decoder in
+snmp_data, on the var-binds a targeted monitoring GET returns.
+
+    python tools/bench_decode.py [--polls 20000]
+"""
+import argparse
+import timeit
+
+import numpy as np
+from pysnmp.proto.rfc1902 import Integer32, ObjectName, OctetString
+
+from _integration import load
+
+const = load("const")
+snmp_data = load("snmp_data")
+
+
+def make_var_binds():
+    values = {
+        const.OID_FREQ_MONITOR: Integer32(98300),
+        const.OID_RF_LEVEL: Integer32(17510),
+        const.OID_MPX_LEVEL: Integer32(19200),
+        const.OID_LEFT_LEVEL: Integer32(-2560),
+        const.OID_RIGHT_LEVEL: Integer32(-2432),
+        const.OID_PILOT_LEVEL: Integer32(1792),
+        const.OID_RDS_LEVEL: Integer32(1024),
+        const.OID_RDS_PI: OctetString("5201"),
+        const.OID_RDS_PS: OctetString("STATION1"),
+        const.OID_RDS_RT: OctetString("Now playing: something on the radio"),
+    }
+    return [(ObjectName(oid), values[oid]) for oid in const.MONITOR_OIDS]
+
+
+def legacy_fr8p8_to_value(fr8p8_value):
+    # The converter snmp_data used before, so the baseline pays its original cost
+    return np.round(int(fr8p8_value) / 256, 1)
+
+
+def legacy_decode(var_binds, freq_data):
+    frequency = None
+    for varBind in var_binds:
+        oid, value = [x.prettyPrint() for x in varBind]
+        if oid == const.OID_FREQ_MONITOR:
+            frequency = value
+            if frequency not in freq_data:
+                freq_data[frequency] = {}
+        elif oid == const.OID_RF_LEVEL:
+            if frequency:
+                freq_data[frequency]['rf_level'] = legacy_fr8p8_to_value(value)
+        elif oid == const.OID_MPX_LEVEL:
+            if frequency:
+                freq_data[frequency]['mpx_level'] = legacy_fr8p8_to_value(value)
+        elif oid == const.OID_LEFT_LEVEL:
+            if frequency:
+                freq_data[frequency]['left_level'] = legacy_fr8p8_to_value(value)
+        elif oid == const.OID_RIGHT_LEVEL:
+            if frequency:
+                freq_data[frequency]['right_level'] = legacy_fr8p8_to_value(value)
+        elif oid == const.OID_PILOT_LEVEL:
+            if frequency:
+                freq_data[frequency]['pilot_level'] = legacy_fr8p8_to_value(value)
+        elif oid == const.OID_RDS_LEVEL:
+            if frequency:
+                freq_data[frequency]['rds_level'] = legacy_fr8p8_to_value(value)
+        elif oid == const.OID_RDS_PI:
+            if frequency:
+                freq_data[frequency]['rds_pi'] = str(value)
+        elif oid == const.OID_RDS_PS:
+            if frequency:
+                freq_data[frequency]['rds_ps'] = str(value)
+        elif oid == const.OID_RDS_RT:
+            if frequency:
+                freq_data[frequency]['rds_rt'] = str(value)
+    return freq_data
+
+
+def table_decode(var_binds, freq_data):
+    frequency, values = snmp_data._decode_monitor_var_binds(var_binds)
+    if frequency:
+        freq_data.setdefault(frequency, {}).update(values)
+    return freq_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--polls", type=int, default=20000)
+    args = parser.parse_args()
+
+    var_binds = make_var_binds()
+    legacy = legacy_decode(var_binds, {})
+    table = table_decode(var_binds, {})
+    if legacy != table:
+        raise SystemExit(f"Decoders disagree:\n  legacy: {legacy}\n  table:  {table}")
+
+    results = {}
+    for label, decode in (("prettyPrint + if/elif", legacy_decode), ("dispatch table", table_decode)):
+        freq_data = {}
+        seconds = min(timeit.repeat(lambda: decode(var_binds, freq_data), number=args.polls, repeat=5))
+        results[label] = seconds / args.polls * 1e6
+        print(f"{label:<24} {results[label]:8.2f} µs/poll")
+    before, after = results.values()
+    print(f"{'speedup':<24} {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
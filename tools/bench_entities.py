@@ -0,0 +1,102 @@
+"""Micro-benchmark for the per-entity cost of a state write.
+
+Builds the sensor entities for a simulated channel table and times the state
+calculation Home Assistant runs on every write (state, availability, attributes,
+name, icon, unit), per entity class. Needs Home Assistant installed.
+
+    python tools/bench_entities.py [--channels 30] [--writes 500] [--repeat 7]
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+from _integration import load
+
+sensor = load("sensor")
+snmp_data = load("snmp_data")
+history_module = load("history")
+
+
+def make_channels(count):
+    return [
+        {
+            "name": f"{(87500 + row * 400) / 1000:.1f} STATION {row + 1}",
+            "active": "5",
+            "frequency": str(87500 + row * 400),
+            "channel_number": str(row),
+            "acq_time": "5",
+            "fw_version": "1.08",
+            "serial_number": "4004000001",
+        }
+        for row in range(count)
+    ]
+
+
+def make_entities(channels):
+    monitoring = {
+        channel["frequency"]: {
+            "rf_level": 68.4, "mpx_level": 75.0, "pilot_level": 7.0, "rds_level": 4.0,
+            "left_level": -10.0, "right_level": -9.5, "rds_pi": "5201", "rds_ps": "STATION", "rds_rt": "Now playing",
+        }
+        for channel in channels
+    }
+    alarms = {int(channel["channel_number"]): {"alarm_rf": "1", "alarm_mpx": "1", "alarm_pilot": "2", "alarm_rds": "1"} for channel in channels}
+    frequencies = [channel["frequency"] for channel in channels]
+    history = history_module.Deva4004History(60, frequencies, snmp_data.MONITOR_LEVEL_FIELDS)
+    for frequency in frequencies:
+        for sample in range(60):
+            for field in snmp_data.MONITOR_LEVEL_FIELDS:
+                history.record(frequency, field, monitoring[frequency][field] + sample % 7 / 10)
+    coordinator = SimpleNamespace(data=monitoring, last_update_success=True, history=history, aggregator=None)
+    alarms_coordinator = SimpleNamespace(data=alarms, last_update_success=True)
+
+    entities = []
+    for data in channels:
+        channel = sensor.Deva4004Channel(data, "DEVA_Bench", "192.0.2.1")
+        for cls in sensor.CHANNEL_SENSORS:
+            entity = cls(coordinator, channel)
+            entities.append(entity)
+        for cls in sensor.ALARM_SENSORS:
+            entity = cls(alarms_coordinator, channel)
+            entity.entity_id = f"sensor.{entity.unique_id.lower().replace('-', '_').replace(' ', '_').replace('.', '_')}"
+            entities.append(entity)
+    return entities
+
+
+def bench(entities, writes, repeat):
+    by_class = {}
+    for entity in entities:
+        by_class.setdefault(type(entity).__name__, []).append(entity)
+
+    results = {}
+    for name, group in by_class.items():
+        # Best of several runs, to keep scheduler noise out of the comparison
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(writes):
+                for entity in group:
+                    entity._async_calculate_state()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = best / (writes * len(group)) * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=30)
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    entities = make_entities(make_channels(args.channels))
+    results = bench(entities, args.writes, args.repeat)
+    for name, per_write in sorted(results.items(), key=lambda item: -item[1]):
+        print(f"{name:32s} {per_write:7.2f} us/write")
+    mean = sum(results.values()) / len(results)
+    print(f"{'mean over classes':32s} {mean:7.2f} us/write")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Measure how long it takes to import the integration's modules.
+
+Every sample runs in a fresh interpreter so nothing is cached in sys.modules. Prints
+the median wall time for each module and the heaviest top-level packages it pulls
+in, as reported by ``python -X importtime``.
+
+    python tools/bench_import.py [--runs 7] [--module snmp_data ...]
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+TOOLS_DIR = Path(__file__).resolve().parent
+
+SNIPPET = """
+import sys, time
+sys.path.insert(0, {tools!r})
+import _integration
+start = time.perf_counter()
+if {module!r}:
+    _integration.load({module!r})
+print(time.perf_counter() - start)
+"""
+
+IMPORTTIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def sample(module: str) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", SNIPPET.format(tools=str(TOOLS_DIR), module=module)],
+        check=True, capture_output=True, text=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _packages(module: str):
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SNIPPET.format(tools=str(TOOLS_DIR), module=module)],
+        check=True, capture_output=True, text=True,
+    )
+    packages = {}
+    for line in out.stderr.splitlines():
+        match = IMPORTTIME.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        root = name.split(".")[0]
+        # Keep the outermost import of each top-level package, that is where its cost lands
+        depth = len(indent)
+        if root not in packages or depth <= packages[root][1]:
+            packages[root] = (int(cumulative), depth)
+    return packages
+
+
+def breakdown(module: str, top: int = 5):
+    # Leave out whatever the measuring harness itself imports
+    harness = _packages("")
+    packages = _packages(module)
+    return sorted(((us, name) for name, (us, _) in packages.items() if name not in harness), reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--module", action="append", help="integration module to import (default: snmp_data)")
+    args = parser.parse_args()
+
+    for module in args.module or ["snmp_data"]:
+        samples = [sample(module) for _ in range(args.runs)]
+        print(f"{module}: median {statistics.median(samples) * 1000:.1f} ms over {args.runs} runs")
+        for us, name in breakdown(module):
+            print(f"  {name:<24} {us / 1000:8.1f} ms cumulative")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Poll-throughput benchmark against simulated DEVA4004 receivers.
+
+Starts tools/simulator.py in a subprocess with N agents on consecutive ports, so
+the agents' CPU time is not charged to the client, then runs back-to-back polls
+from every device at once through one shared SnmpEngine, the way the fleet poller
+does. Reports polls per second, p50/p95 latency and client CPU time per poll for
+each device count from 1 to --devices.
+
+    python tools/bench_poll.py --devices 8 --operation monitor --duration 5
+    python tools/bench_poll.py --devices 4 --operation alarms --latency 0.01 --loss 0.01
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from pysnmp.hlapi.v3arch.asyncio import SnmpEngine
+
+from _integration import load
+
+const = load("const")
+snmp_data = load("snmp_data")
+
+SIMULATOR = Path(__file__).resolve().parent / "simulator.py"
+
+
+async def _poll_monitor(session, monitor_mode):
+    frequency, _ = await snmp_data._get_monitor_sample(session, const.BASE_OID_MONITORING, monitor_mode)
+    return frequency is not None
+
+
+async def _poll_alarms(session, monitor_mode):
+    return bool(await snmp_data._get_alarms_data(session))
+
+
+async def _poll_logger(session, monitor_mode):
+    _, errors = await snmp_data._get_logger_data(session)
+    return not errors
+
+
+OPERATIONS = {
+    "monitor": _poll_monitor,
+    "alarms": _poll_alarms,
+    "logger": _poll_logger,
+}
+
+
+async def _device(session, poll, monitor_mode, deadline, latencies):
+    errors = 0
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        try:
+            ok = await poll(session, monitor_mode)
+        except Exception:
+            ok = False
+        latencies.append(time.monotonic() - start)
+        errors += not ok
+    return errors
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(engine, devices, port, community, version, operation, monitor_mode, duration):
+    fleet = asyncio.Semaphore(const.FLEET_MAX_IN_FLIGHT)
+    sessions = [
+        snmp_data.Deva4004Session(engine, "127.0.0.1", port + device, community, fleet_in_flight=fleet, version=version)
+        for device in range(devices)
+    ]
+    poll = OPERATIONS[operation]
+    # One untimed poll per device so transports and the engine are warmed up
+    await asyncio.gather(*(poll(session, monitor_mode) for session in sessions))
+
+    latencies = []
+    cpu = time.process_time()
+    start = time.monotonic()
+    deadline = start + duration
+    errors = await asyncio.gather(*(_device(session, poll, monitor_mode, deadline, latencies) for session in sessions))
+    elapsed = time.monotonic() - start
+    cpu = time.process_time() - cpu
+    pdus = sum(counters.pdus for session in sessions for counters in session.metrics.operations.values())
+    operations = sum(counters.count for session in sessions for counters in session.metrics.operations.values())
+    return {
+        "devices": devices,
+        "polls": len(latencies),
+        "pdus_per_poll": pdus / operations,
+        "polls_per_second": len(latencies) / elapsed,
+        "p50_ms": _percentile(latencies, 0.5) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "cpu_per_poll_ms": cpu / len(latencies) * 1000,
+        "errors": sum(errors),
+    }
+
+
+def _start_simulator(args):
+    command = [
+        sys.executable, str(SIMULATOR),
+        "--devices", str(args.devices), "--port", str(args.port), "--channels", str(args.channels),
+        "--latency", str(args.latency), "--jitter", str(args.jitter), "--loss", str(args.loss),
+        "--community", args.community,
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    # The simulator prints one line per agent once it is listening
+    for _ in range(args.devices):
+        if not process.stdout.readline():
+            process.kill()
+            raise SystemExit("Simulator failed to start")
+    return process
+
+
+async def _main(args):
+    engine = SnmpEngine()
+    try:
+        print(f"{'devices':>7} {'polls':>7} {'pdus/op':>8} {'polls/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'cpu/poll ms':>12} {'errors':>7}")
+        for devices in range(1, args.devices + 1):
+            result = await run(engine, devices, args.port, args.community, args.snmp_version, args.operation, args.monitor_mode, args.duration)
+            print(
+                f"{result['devices']:>7} {result['polls']:>7} {result['pdus_per_poll']:>8.1f} {result['polls_per_second']:>9.1f} "
+                f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['cpu_per_poll_ms']:>12.3f} {result['errors']:>7}"
+            )
+    finally:
+        engine.close_dispatcher()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--devices", type=int, default=4, help="benchmark 1 to this many devices")
+    parser.add_argument("--operation", choices=sorted(OPERATIONS), default="monitor")
+    parser.add_argument("--monitor-mode", choices=(const.MONITOR_MODE_TARGETED, const.MONITOR_MODE_WALK), default=const.MONITOR_MODE_TARGETED)
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per device count")
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=16100)
+    parser.add_argument("--community", default="DEVA4004")
+    parser.add_argument("--snmp-version", choices=(const.SNMP_VERSION_1, const.SNMP_VERSION_2C), default=const.SNMP_VERSION_2C)
+    args = parser.parse_args()
+
+    process = _start_simulator(args)
+    try:
+        asyncio.run(_main(args))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
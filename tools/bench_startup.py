@@ -0,0 +1,73 @@
+"""Startup-cost benchmark for the integration's modules.
+
+Imports each module in a fresh interpreter, after the Home Assistant modules a
+running instance already has loaded, and reports the median import time and
+whether pysnmp came with it; then times SnmpEngine construction, which the
+integration does in the executor. Needs Home Assistant installed.
+
+    python tools/bench_startup.py [--repeat 7]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODULES = (
+    "custom_components.deva4004",
+    "custom_components.deva4004.config_flow",
+    "custom_components.deva4004.sensor",
+)
+
+# Already imported by the time Home Assistant loads a custom integration
+PRELOADED = (
+    "homeassistant.core",
+    "homeassistant.config_entries",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.helpers.storage",
+    "homeassistant.helpers.update_coordinator",
+    "homeassistant.helpers.event",
+    "homeassistant.components.sensor",
+    "voluptuous",
+)
+
+_IMPORT = """
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+for name in {preloaded!r}:
+    importlib.import_module(name)
+start = time.perf_counter()
+importlib.import_module({module!r})
+print(json.dumps({{"ms": (time.perf_counter() - start) * 1000, "pysnmp": "pysnmp" in sys.modules}}))
+"""
+
+_ENGINE = """
+import json, time
+from pysnmp.hlapi.v3arch.asyncio import SnmpEngine
+start = time.perf_counter()
+SnmpEngine()
+print(json.dumps({"ms": (time.perf_counter() - start) * 1000}))
+"""
+
+
+def _run(code):
+    return json.loads(subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    for module in MODULES:
+        runs = [_run(_IMPORT.format(root=str(ROOT), preloaded=PRELOADED, module=module)) for _ in range(args.repeat)]
+        print(f"{module:42s} {statistics.median(run['ms'] for run in runs):8.1f} ms  pysnmp imported: {runs[0]['pysnmp']}")
+    engine = [_run(_ENGINE)["ms"] for _ in range(args.repeat)]
+    print(f"{'SnmpEngine()':42s} {statistics.median(engine):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Send a DEVA4004-style alarm notification to the integration's trap listener.
+
+Builds an SNMPv1 trap, SNMPv2c trap or SNMPv2c inform carrying alarm table
+var-binds, so the trap path can be exercised without a real receiver. The
+listener only accepts notifications from a configured device address, so point
+an entry at 127.0.0.1 (e.g. the simulator from the same host) when testing.
+
+    python tools/send_trap.py --port 1162 --channel 3 --alarm rf --state low
+"""
+import argparse
+import asyncio
+import time
+
+from pyasn1.codec.ber import decoder, encoder
+from pysnmp.proto import api
+from pysnmp.proto.rfc1902 import Integer32, ObjectName
+
+from _integration import load
+
+const = load("const")
+
+ALARM_COLUMNS = {
+    "rf": const.BASE_OID_ALARM_RF,
+    "mpx": const.BASE_OID_ALARM_MPX,
+    "pilot": const.BASE_OID_ALARM_PILOT,
+    "rds": const.BASE_OID_ALARM_RDS,
+}
+STATES = {"disabled": 0, "ok": 1, "low": 2, "high": 3}
+ENTERPRISE = (1, 3, 6, 1, 4, 1, 35833, 10)
+SNMP_TRAP_OID = (1, 3, 6, 1, 6, 3, 1, 1, 4, 1, 0)
+SYS_UPTIME = (1, 3, 6, 1, 2, 1, 1, 3, 0)
+
+
+def build_notification(version, community, var_binds, inform=False):
+    module = api.PROTOCOL_MODULES[version]
+    if version == api.SNMP_VERSION_1:
+        pdu = module.TrapPDU()
+        module.apiTrapPDU.set_defaults(pdu)
+        module.apiTrapPDU.set_enterprise(pdu, ENTERPRISE)
+        module.apiTrapPDU.set_generic_trap(pdu, 6)
+        module.apiTrapPDU.set_specific_trap(pdu, 1)
+        module.apiTrapPDU.set_varbinds(pdu, var_binds)
+    else:
+        pdu = module.InformRequestPDU() if inform else module.SNMPv2TrapPDU()
+        module.apiPDU.set_defaults(pdu)
+        uptime = module.TimeTicks(int(time.monotonic() * 100) % 2**32)
+        module.apiPDU.set_varbinds(pdu, [(SYS_UPTIME, uptime), (SNMP_TRAP_OID, ObjectName(ENTERPRISE + (0, 1)))] + var_binds)
+    message = module.Message()
+    module.apiMessage.set_defaults(message)
+    module.apiMessage.set_community(message, community)
+    module.apiMessage.set_pdu(message, pdu)
+    return encoder.encode(message)
+
+
+class _SenderProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.response = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data, addr):
+        if not self.response.done():
+            self.response.set_result(data)
+
+
+async def send(host, port, payload, wait_response, timeout):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(_SenderProtocol, remote_addr=(host, port))
+    try:
+        transport.sendto(payload)
+        if not wait_response:
+            return None
+        return await asyncio.wait_for(protocol.response, timeout)
+    finally:
+        transport.close()
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Send a DEVA4004 alarm trap")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=const.DEFAULT_TRAP_PORT)
+    parser.add_argument("--community", default=const.DEFAULT_READ_COMMUNITY)
+    parser.add_argument("--version", choices=("1", "2c"), default="2c")
+    parser.add_argument("--inform", action="store_true", help="send an inform and wait for the acknowledgement")
+    parser.add_argument("--channel", type=int, default=1, help="alarm table row (1-based)")
+    parser.add_argument("--alarm", choices=sorted(ALARM_COLUMNS), default="rf")
+    parser.add_argument("--state", choices=sorted(STATES, key=STATES.get), default="low")
+    return parser.parse_args()
+
+
+def main():
+    args = _parse_args()
+    version = api.SNMP_VERSION_1 if args.version == "1" else api.SNMP_VERSION_2C
+    if args.inform and version == api.SNMP_VERSION_1:
+        raise SystemExit("Informs need SNMPv2c")
+    oid = tuple(int(x) for x in ALARM_COLUMNS[args.alarm].strip(".").split(".")) + (args.channel,)
+    payload = build_notification(version, args.community, [(oid, Integer32(STATES[args.state]))], args.inform)
+    response = asyncio.run(send(args.host, args.port, payload, args.inform, timeout=2.0))
+    if args.inform:
+        module = api.PROTOCOL_MODULES[version]
+        message, _ = decoder.decode(response, asn1Spec=module.Message())
+        print(f"Inform acknowledged ({module.apiMessage.get_pdu(message).__class__.__name__})")
+    print(f"Sent {args.alarm} {args.state} for channel {args.channel} to {args.host}:{args.port}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Local DEVA4004 SNMP agent simulator.
+
+Serves the OID tree from ``custom_components/deva4004/const.py`` over SNMPv1 and
+SNMPv2c on localhost so the polling code can be exercised and benchmarked without
+a real receiver: the channel table, firmware/serial scalars, the monitoring
+scalars of whichever channel the simulated scan is on, and the alarm table.
+Channel count, scan dwell, RDS text, response latency, jitter and packet loss are
+configurable.
+
+    python tools/simulator.py --channels 30 --port 16100 --latency 0.02 --loss 0.01
+"""
+import argparse
+import asyncio
+import bisect
+import logging
+import random
+import time
+
+from pyasn1.codec.ber import decoder, encoder
+from pysnmp.proto import api
+from pysnmp.proto.rfc1902 import Integer32, OctetString
+
+from _integration import load
+
+const = load("const")
+
+_LOGGER = logging.getLogger("deva4004.simulator")
+
+
+def _oid(oid):
+    return tuple(int(x) for x in oid.strip(".").split("."))
+
+
+OID_FW_VERSION = _oid(const.OID_FW_VERSION)
+OID_SERIAL_VERSION = _oid(const.OID_SERIAL_VERSION)
+MONITORING = _oid(const.BASE_OID_MONITORING)
+OID_FREQ_MONITOR = _oid(const.OID_FREQ_MONITOR)
+MONITOR_LEVELS = tuple(_oid(oid) for oid in (
+    const.OID_RF_LEVEL, const.OID_MPX_LEVEL, const.OID_PILOT_LEVEL,
+    const.OID_RDS_LEVEL, const.OID_LEFT_LEVEL, const.OID_RIGHT_LEVEL,
+))
+# Scalars in the monitoring subtree the integration does not read, so walks see a
+# subtree about as long as the receiver's
+MONITOR_EXTRA = (2, 4, 5, 6, 7, 8, 10, 11, 12, 13, 14, 16, 17, 19, 20, 22, 23, 25, 26, 27, 28, 29, 30, 43, 44, 45)
+
+# The alarm table also has columns the integration skips (1 and 4); set_alarm() and
+# send_trap.py address columns by their number
+ALARM_TABLE = _oid(const.BASE_OID_ALARM_RF)[:-1]
+ALARM_COLUMNS = tuple(sorted({1, 4} | {_oid(column)[-1] for column in const.ALARM_TABLE_COLUMNS}))
+
+SNMP_VERSIONS = {"1": api.SNMP_VERSION_1, "2c": api.SNMP_VERSION_2C}
+
+
+class Deva4004Simulator:
+    def __init__(self, channels=8, acq_time=5, scan=True, rds_text="DEVA4004 SIMULATOR",
+                 latency=0.0, jitter=0.0, loss=0.0, community="DEVA4004", serial=None, seed=None, versions=("1", "2c")):
+        self.channels = channels
+        self.acq_time = acq_time
+        self.scan = scan
+        self.rds_text = rds_text
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.community = community
+        # Requests in other SNMP versions are dropped, like a v1-only receiver would
+        self.versions = {SNMP_VERSIONS[version] for version in versions}
+        self.random = random.Random(seed)
+        self.serial = serial or f"4004{self.random.randrange(10**6):06d}"
+        self.started = time.monotonic()
+        self.requests = 0
+        self.dropped = 0
+        self.alarms = {(column, row): 1 for column in ALARM_COLUMNS for row in range(1, channels + 1)}
+        self._oids = []
+        self._values = {}
+        self._build()
+
+    def frequency(self, row):
+        return 87500 + (row - 1) * 400
+
+    def current_row(self):
+        if not self.scan:
+            return 1
+        elapsed = time.monotonic() - self.started
+        return int(elapsed // self.acq_time) % self.channels + 1
+
+    def set_alarm(self, row, column, value):
+        self.alarms[(column, row)] = value
+
+    def _add(self, oid, value):
+        self._values[oid] = value
+
+    def _build(self):
+        self._add(OID_FW_VERSION, lambda: OctetString("1.08"))
+        self._add(OID_SERIAL_VERSION, lambda: OctetString(self.serial))
+        for row in range(1, self.channels + 1):
+            frequency = self.frequency(row)
+            self._add(_oid(const.BASE_OID_CHANNEL_NUMBER) + (row,), lambda row=row: Integer32(row - 1))
+            self._add(_oid(const.BASE_OID_ACTIVE_INACTIVE) + (row,), lambda: Integer32(5))
+            self._add(_oid(const.BASE_OID_FREQUENCY_MHZ) + (row,), lambda frequency=frequency: Integer32(frequency))
+            self._add(_oid(const.BASE_OID_NAME) + (row,), lambda frequency=frequency, row=row: OctetString(f"{frequency / 1000:.1f} STATION {row}"))
+            self._add(_oid(const.BASE_OID_ACQ_TIME) + (row,), lambda: Integer32(self.acq_time))
+            for column in ALARM_COLUMNS:
+                self._add(ALARM_TABLE + (column, row), lambda column=column, row=row: Integer32(self.alarms[(column, row)]))
+        self._add(OID_FREQ_MONITOR, lambda: Integer32(self.frequency(self.current_row())))
+        for oid in MONITOR_LEVELS:
+            self._add(oid, lambda: Integer32(self.random.randrange(20 * 256, 90 * 256)))
+        self._add(_oid(const.OID_RDS_PI), lambda: OctetString(f"{0x5200 + self.current_row():04X}"))
+        self._add(_oid(const.OID_RDS_PS), lambda: OctetString(f"STAT{self.current_row():04d}"))
+        self._add(_oid(const.OID_RDS_RT), lambda: OctetString(self.rds_text))
+        for index in MONITOR_EXTRA:
+            self._add(MONITORING + (index, 0), lambda: Integer32(self.random.randrange(0, 256)))
+        self._oids = sorted(self._values)
+
+    def get(self, oid):
+        value = self._values.get(oid)
+        return value() if value is not None else None
+
+    def get_next(self, oid):
+        index = bisect.bisect_right(self._oids, oid)
+        if index >= len(self._oids):
+            return None, None
+        next_oid = self._oids[index]
+        return next_oid, self._values[next_oid]()
+
+    def handle(self, payload):
+        version = int(api.decodeMessageVersion(payload))
+        if version not in self.versions:
+            return None
+        module = api.PROTOCOL_MODULES[version]
+        request, _ = decoder.decode(payload, asn1Spec=module.Message())
+        if bytes(module.apiMessage.get_community(request)) != self.community.encode():
+            return None
+        response = module.apiMessage.get_response(request)
+        request_pdu = module.apiMessage.get_pdu(request)
+        response_pdu = module.apiMessage.get_pdu(response)
+        var_binds = [(tuple(oid), value) for oid, value in module.apiPDU.get_varbinds(request_pdu)]
+        out = []
+        error_status = 0
+        error_index = 0
+
+        if request_pdu.isSameTypeWith(module.GetRequestPDU()):
+            for position, (oid, _) in enumerate(var_binds, 1):
+                value = self.get(oid)
+                if value is None:
+                    if version == api.SNMP_VERSION_1:
+                        error_status, error_index = 2, position
+                        break
+                    value = module.NoSuchInstance("")
+                out.append((oid, value))
+        elif request_pdu.isSameTypeWith(module.GetNextRequestPDU()):
+            for position, (oid, _) in enumerate(var_binds, 1):
+                next_oid, value = self.get_next(oid)
+                if next_oid is None:
+                    if version == api.SNMP_VERSION_1:
+                        error_status, error_index = 2, position
+                        break
+                    next_oid, value = oid, module.EndOfMibView("")
+                out.append((next_oid, value))
+        elif version == api.SNMP_VERSION_2C and request_pdu.isSameTypeWith(module.GetBulkRequestPDU()):
+            non_repeaters = int(module.apiBulkPDU.get_non_repeaters(request_pdu))
+            max_repetitions = int(module.apiBulkPDU.get_max_repetitions(request_pdu))
+            for oid, _ in var_binds[:non_repeaters]:
+                next_oid, value = self.get_next(oid)
+                out.append((next_oid, value) if next_oid else (oid, module.EndOfMibView("")))
+            cursors = [oid for oid, _ in var_binds[non_repeaters:]]
+            for _ in range(max_repetitions):
+                if not cursors:
+                    break
+                ended = True
+                for column, oid in enumerate(cursors):
+                    next_oid, value = self.get_next(oid)
+                    if next_oid is None:
+                        out.append((oid, module.EndOfMibView("")))
+                    else:
+                        out.append((next_oid, value))
+                        cursors[column] = next_oid
+                        ended = False
+                if ended:
+                    break
+        else:
+            return None
+
+        if error_status:
+            module.apiPDU.set_error_status(response_pdu, error_status)
+            module.apiPDU.set_error_index(response_pdu, error_index)
+            out = var_binds
+        module.apiPDU.set_varbinds(response_pdu, out)
+        return encoder.encode(response)
+
+
+class _AgentProtocol(asyncio.DatagramProtocol):
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        simulator = self.simulator
+        simulator.requests += 1
+        if simulator.loss and simulator.random.random() < simulator.loss:
+            simulator.dropped += 1
+            return
+        try:
+            response = simulator.handle(data)
+        except Exception as e:
+            _LOGGER.debug("Dropping undecodable request from %s: %s", addr, e)
+            return
+        if response is None:
+            return
+        delay = simulator.latency
+        if simulator.jitter:
+            delay += simulator.random.uniform(0, simulator.jitter)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self.transport.sendto, response, addr)
+        else:
+            self.transport.sendto(response, addr)
+
+
+async def start_simulator(simulator, host="127.0.0.1", port=0):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(lambda: _AgentProtocol(simulator), local_addr=(host, port))
+    return transport, transport.get_extra_info("sockname")[1]
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="DEVA4004 SNMP agent simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=16100)
+    parser.add_argument("--devices", type=int, default=1, help="number of agents on consecutive ports")
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--acq-time", type=int, default=5)
+    parser.add_argument("--no-scan", action="store_true", help="stay tuned to the first channel")
+    parser.add_argument("--rds-text", default="DEVA4004 SIMULATOR")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--community", default="DEVA4004")
+    parser.add_argument("--snmp-versions", nargs="+", choices=sorted(SNMP_VERSIONS), default=["1", "2c"], help="SNMP versions to answer")
+    return parser.parse_args()
+
+
+async def _main(args):
+    for device in range(args.devices):
+        simulator = Deva4004Simulator(
+            channels=args.channels, acq_time=args.acq_time, scan=not args.no_scan, rds_text=args.rds_text,
+            latency=args.latency, jitter=args.jitter, loss=args.loss, community=args.community,
+            versions=args.snmp_versions,
+        )
+        _, port = await start_simulator(simulator, args.host, args.port + device)
+        print(f"DEVA4004 simulator {simulator.serial} listening on {args.host}:{port}", flush=True)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_main(_parse_args()))
+    except KeyboardInterrupt:
+        pass